@@ -12,14 +12,21 @@
 
 import copy
 import doctest
+import multiprocessing
+import multiprocessing.shared_memory
+import os
 import pathlib
 
+import numpy as np
+
 
 HERE = pathlib.Path(__file__).resolve().parent
 OPCODE_ADD = 1
 OPCODE_MULTIPLY = 2
 OPCODE_HALT = 99
 EXPECTED_OUTPUT = 19690720
+# Program image shared with (and mapped read-only by) each pool worker.
+WORKER_IMAGE = None
 
 
 def validate_index(value, length):
@@ -108,16 +115,117 @@ def inputs_search(program, expected_output):
     raise RuntimeError("No match found")
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+class CopyOnWriteProgram:
+    """A program backed by a shared, read-only image.
+
+    Writes go to a private overlay, so only the cells that a run actually
+    touches are copied. ``copy.deepcopy()`` copies the overlay but keeps
+    sharing the image.
+    """
+
+    def __init__(self, image, writes=None):
+        self.image = image
+        self.writes = {} if writes is None else writes
+
+    def __len__(self):
+        return len(self.image)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            values = self.image[index].tolist()
+            indices = range(*index.indices(len(self)))
+            for offset, i in enumerate(indices):
+                if i in self.writes:
+                    values[offset] = self.writes[i]
+            return values
+
+        if index in self.writes:
+            return self.writes[index]
+        return self.image[index]
+
+    def __setitem__(self, index, value):
+        if not 0 <= index < len(self):
+            raise IndexError("Index outside of range", index)
+        self.writes[index] = value
+
+    def __deepcopy__(self, memo):
+        return CopyOnWriteProgram(self.image, dict(self.writes))
+
+
+def attach_worker_image(name, size):
+    global WORKER_IMAGE
+
+    shared = multiprocessing.shared_memory.SharedMemory(name=name)
+    # NOTE: A read-only ``memoryview`` of 64-bit integers is cheaper to index
+    #       (one cell at a time) than a NumPy array.
+    image = shared.buf.toreadonly().cast("q")
+    assert len(image) == size
+    WORKER_IMAGE = (shared, image)
+
+
+def search_noun(noun_and_expected):
+    noun, expected_output = noun_and_expected
+    _, image = WORKER_IMAGE
+    program = CopyOnWriteProgram(image)
+    for verb in range(100):
+        output = run_parameterized_program(program, noun, verb)
+        if output == expected_output:
+            return noun, verb
+
+    return None
+
+
+def inputs_search_parallel(program, expected_output, processes=None):
+    """Parallel version of :func:`inputs_search` (one task per noun).
+
+    The program image is placed in shared memory once, rather than being
+    pickled and sent along with every task.
+    """
+    values = np.asarray(program, dtype=np.int64)
+    shared = multiprocessing.shared_memory.SharedMemory(
+        create=True, size=values.nbytes
+    )
+    image = np.ndarray(values.shape, dtype=np.int64, buffer=shared.buf)
+    image[:] = values
+    try:
+        with multiprocessing.Pool(
+            processes=processes,
+            initializer=attach_worker_image,
+            initargs=(shared.name, values.size),
+        ) as pool:
+            tasks = [(noun, expected_output) for noun in range(100)]
+            for match in pool.imap(search_noun, tasks):
+                if match is not None:
+                    return match
+    finally:
+        del image
+        shared.close()
+        shared.unlink()
+
+    raise RuntimeError("No match found")
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = [int(value) for value in content.split(",")]
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def main():
+    filename = HERE / "input.txt"
+    program = load_program(filename).tolist()
     output1202 = run_parameterized_program(program, 12, 2)
     print(f"Program output at position 0: {output1202}")
 
-    noun, verb = inputs_search(program, EXPECTED_OUTPUT)
+    if (os.cpu_count() or 1) > 1:
+        noun, verb = inputs_search_parallel(program, EXPECTED_OUTPUT)
+    else:
+        noun, verb = inputs_search(program, EXPECTED_OUTPUT)
     print(f"{noun:02}{verb:02} produces {EXPECTED_OUTPUT}")
 
 
@@ -14,6 +14,8 @@ import copy
 import doctest
 import pathlib
 
+import numpy as np
+
 
 HERE = pathlib.Path(__file__).resolve().parent
 OPCODES = {
@@ -310,12 +312,20 @@ def run_intcode(program, std_input, std_output):
     return running_program
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = [int(value) for value in content.strip().split(",")]
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def main():
+    filename = HERE / "input.txt"
+    program = load_program(filename).tolist()
 
     std_input_list = [1]
     std_input = iter(std_input_list)
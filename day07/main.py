@@ -10,12 +10,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
 import copy
 import itertools
+import os
 import pathlib
 import threading
 import time
 
+import numpy as np
+
 
 HERE = pathlib.Path(__file__).resolve().parent
 OPCODES = {
@@ -32,6 +36,150 @@ OPCODES = {
 POSITION_MODE = "0"
 IMMEDIATE_MODE = "1"
 ALL_MODES = set("01")
+METRICS_INTERVAL = 5.0
+METRIC_SPECS = (
+    ("instructions", "counter", "Instructions executed."),
+    ("inputs", "counter", "Input values consumed."),
+    ("outputs", "counter", "Output values produced."),
+    ("input_wait_seconds", "counter", "Time spent blocked waiting on input."),
+    ("run_seconds", "counter", "Time spent running (including waits)."),
+    ("memory_high_water", "gauge", "Largest memory size, in cells."),
+)
+
+
+class RunMetrics:
+    """Counters for the runs of a single Intcode VM."""
+
+    def __init__(self, name):
+        self.name = name
+        self.instructions = 0
+        self.inputs = 0
+        self.outputs = 0
+        self.input_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.memory_high_water = 0
+
+    def observe_memory(self, program):
+        size = len(program)
+        if size > self.memory_high_water:
+            self.memory_high_water = size
+
+    def compute_seconds(self):
+        return self.run_seconds - self.input_wait_seconds
+
+
+class MeteredInput:
+    """Count the inputs consumed (and time spent waiting on them).
+
+    An input channel that does more than wait (e.g. one that also updates
+    and renders a game board) sets ``times_input_wait`` and adds its own
+    waits to ``input_wait_seconds``. If ``program`` is provided, the
+    memory size is observed at every input, i.e. whenever the VM pauses.
+    """
+
+    def __init__(self, std_input, metrics, program=None):
+        self.std_input = std_input
+        self.metrics = metrics
+        self.program = program
+        self.timed = not getattr(std_input, "times_input_wait", False)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.program is not None:
+            self.metrics.observe_memory(self.program)
+        if self.timed:
+            start = time.perf_counter()
+            try:
+                value = next(self.std_input)
+            finally:
+                wait_seconds = time.perf_counter() - start
+                self.metrics.input_wait_seconds += wait_seconds
+        else:
+            value = next(self.std_input)
+        self.metrics.inputs += 1
+        return value
+
+
+class MeteredOutput:
+    def __init__(self, std_output, metrics):
+        self.std_output = std_output
+        self.metrics = metrics
+
+    def append(self, value):
+        self.metrics.outputs += 1
+        self.std_output.append(value)
+
+
+def format_prometheus(all_metrics):
+    lines = []
+    for attribute, metric_type, description in METRIC_SPECS:
+        name = f"intcode_{attribute}"
+        if metric_type == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for metrics in all_metrics:
+            value = getattr(metrics, attribute)
+            lines.append(f'{name}{{vm="{metrics.name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Registry of :class:`RunMetrics`, periodically dumped to ``path``.
+
+    The file uses the Prometheus text format, e.g. for the node exporter's
+    textfile collector.
+    """
+
+    def __init__(self, path, interval=METRICS_INTERVAL):
+        self.path = pathlib.Path(path)
+        self.interval = interval
+        self.registry = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def metrics(self, name):
+        with self.lock:
+            metrics = self.registry.get(name)
+            if metrics is None:
+                metrics = RunMetrics(name)
+                self.registry[name] = metrics
+            return metrics
+
+    def start(self):
+        self.thread = threading.Thread(target=self.export_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+
+    def export_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with self.lock:
+            all_metrics = list(self.registry.values())
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as file_obj:
+            file_obj.write(format_prometheus(all_metrics))
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        lines = []
+        for metrics in self.registry.values():
+            lines.append(
+                f"{metrics.name}: {metrics.instructions} instructions, "
+                f"{metrics.compute_seconds():.3f}s compute, "
+                f"{metrics.input_wait_seconds:.3f}s blocked on input"
+            )
+        return "\n".join(lines)
 
 
 def do_add(modes, params, program):
@@ -293,8 +441,13 @@ def execute_instruction(
     raise ValueError("Bad instruction", instruction, modes, params, program)
 
 
-def run_intcode(program, std_input, std_output):
+def run_intcode(program, std_input, std_output, metrics=None):
     running_program = copy.deepcopy(program)
+    if metrics is not None:
+        start = time.perf_counter()
+        std_input = MeteredInput(std_input, metrics, program=running_program)
+        std_output = MeteredOutput(std_output, metrics)
+        metrics.observe_memory(running_program)
 
     jump_index = -1
     index = 0
@@ -308,22 +461,37 @@ def run_intcode(program, std_input, std_output):
         )
         if jump_index >= 0:
             index = jump_index
+        if metrics is not None:
+            metrics.instructions += 1
+
+    if metrics is not None:
+        metrics.run_seconds += time.perf_counter() - start
+        metrics.observe_memory(running_program)
 
     return running_program
 
 
-def run_it(program, input_, std_output=None):
+def run_it(program, input_, std_output=None, metrics=None):
     std_input = iter(input_)
     if std_output is None:
         std_output = []
-    run_intcode(program, std_input, std_output)
+    run_intcode(program, std_input, std_output, metrics=metrics)
     return std_output
 
 
-def run_sequence(program, sequence):
+def get_metrics(exporter, name):
+    if exporter is None:
+        return None
+    return exporter.metrics(name)
+
+
+def run_sequence(program, sequence, exporter=None):
     output_value = 0
-    for sequence_value in sequence:
-        output_value, = run_it(program, [sequence_value, output_value])
+    for name, sequence_value in zip("ABCDE", sequence):
+        metrics = get_metrics(exporter, f"serial-{name}")
+        output_value, = run_it(
+            program, [sequence_value, output_value], metrics=metrics
+        )
     return output_value
 
 
@@ -352,7 +520,7 @@ class BlockingStream:
             self.values.append(value)
 
 
-def run_sequence_connected(program, sequence):
+def run_sequence_connected(program, sequence, exporter=None):
     vA, vB, vC, vD, vE = sequence
     sA = BlockingStream([vA, 0])
     sB = BlockingStream([vB])
@@ -360,11 +528,26 @@ def run_sequence_connected(program, sequence):
     sD = BlockingStream([vD])
     sE = BlockingStream([vE])
 
-    tAB = threading.Thread(target=run_it, args=(program, sA, sB))
-    tBC = threading.Thread(target=run_it, args=(program, sB, sC))
-    tCD = threading.Thread(target=run_it, args=(program, sC, sD))
-    tDE = threading.Thread(target=run_it, args=(program, sD, sE))
-    tEA = threading.Thread(target=run_it, args=(program, sE, sA))
+    tAB = threading.Thread(
+        target=run_it,
+        args=(program, sA, sB, get_metrics(exporter, "feedback-A")),
+    )
+    tBC = threading.Thread(
+        target=run_it,
+        args=(program, sB, sC, get_metrics(exporter, "feedback-B")),
+    )
+    tCD = threading.Thread(
+        target=run_it,
+        args=(program, sC, sD, get_metrics(exporter, "feedback-C")),
+    )
+    tDE = threading.Thread(
+        target=run_it,
+        args=(program, sD, sE, get_metrics(exporter, "feedback-D")),
+    )
+    tEA = threading.Thread(
+        target=run_it,
+        args=(program, sE, sA, get_metrics(exporter, "feedback-E")),
+    )
     tAB.start()
     tBC.start()
     tCD.start()
@@ -380,17 +563,30 @@ def run_sequence_connected(program, sequence):
     return sA.values[-1]
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = [int(value) for value in content.strip().split(",")]
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def main(metrics_file=None, metrics_interval=METRICS_INTERVAL):
+    filename = HERE / "input.txt"
+    program = load_program(filename).tolist()
+
+    exporter = None
+    if metrics_file is not None:
+        exporter = MetricsExporter(metrics_file, interval=metrics_interval)
+        exporter.start()
 
     max_value = 0
     max_permutation = None
     for permutation in itertools.permutations((0, 1, 2, 3, 4)):
-        value = run_sequence(program, permutation)
+        value = run_sequence(program, permutation, exporter=exporter)
         if value > max_value:
             max_value = value
             max_permutation = permutation
@@ -400,13 +596,27 @@ def main():
     max_value = 0
     max_permutation = None
     for permutation in itertools.permutations((5, 6, 7, 8, 9)):
-        value = run_sequence_connected(program, permutation)
+        value = run_sequence_connected(program, permutation, exporter=exporter)
         if value > max_value:
             max_value = value
             max_permutation = permutation
 
     print(f"Feedback I/O: {max_permutation} -> {max_value}")
 
+    if exporter is not None:
+        exporter.stop()
+        print(exporter.summary())
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--metrics-file", help="Prometheus text file to export metrics to"
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=METRICS_INTERVAL
+    )
+    args = parser.parse_args()
+    main(
+        metrics_file=args.metrics_file, metrics_interval=args.metrics_interval
+    )
@@ -0,0 +1,108 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Thin client for the Intcode job server (see ``server.py``).
+
+Only uses the standard library, so scripts using it skip the NumPy import
+and program parsing entirely.
+"""
+
+import argparse
+import json
+import pathlib
+import socket
+import tempfile
+
+
+DEFAULT_SOCKET = pathlib.Path(tempfile.gettempdir()) / "intcode-server.sock"
+
+
+class JobError(RuntimeError):
+    pass
+
+
+class IntcodeClient:
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(socket_path))
+        self.file_obj = self.sock.makefile("rwb")
+        self.last_metrics = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file_obj.close()
+        self.sock.close()
+
+    def request(self, payload):
+        self.file_obj.write(json.dumps(payload).encode("utf-8") + b"\n")
+        self.file_obj.flush()
+        line = self.file_obj.readline()
+        if not line:
+            raise ConnectionError("Server closed the connection")
+        return json.loads(line)
+
+    def run_batch(self, jobs):
+        """Run a batch of jobs; returns the outputs of each job.
+
+        Each job is a dictionary with a ``program`` ID (e.g. ``"day09"``),
+        a list of ``inputs`` and (optionally) ``patches`` mapping memory
+        addresses to values to set before running.
+        """
+        response = self.request({"jobs": jobs})
+        if isinstance(response, dict):
+            raise JobError(jobs, response["error"])
+        self.last_metrics = [result.get("metrics") for result in response]
+        all_outputs = []
+        for job, result in zip(jobs, response):
+            if "error" in result:
+                raise JobError(job, result["error"])
+            all_outputs.append(result["outputs"])
+        return all_outputs
+
+    def run(self, program_id, inputs, patches=None):
+        job = {"program": program_id, "inputs": list(inputs)}
+        if patches:
+            job["patches"] = patches
+        outputs, = self.run_batch([job])
+        return outputs
+
+    def stats(self):
+        return self.request({"command": "stats"})
+
+
+def run_intcode(program_id, inputs, socket_path=DEFAULT_SOCKET):
+    """Drop-in for ``run_intcode()`` calls that only use list I/O."""
+    with IntcodeClient(socket_path) as client:
+        return client.run(program_id, inputs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("program", help="Program ID, e.g. day09")
+    parser.add_argument("inputs", nargs="*", type=int)
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--metrics", action="store_true")
+    args = parser.parse_args()
+
+    with IntcodeClient(args.socket) as client:
+        print(client.run(args.program, args.inputs))
+        if args.metrics:
+            print(client.last_metrics[0])
+
+
+if __name__ == "__main__":
+    main()
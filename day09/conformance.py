@@ -0,0 +1,660 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Differential conformance and performance matrix for Intcode engines.
+
+Runs every engine (i.e. every day's copy of ``run_intcode()`` or of the
+resumable ``Machine`` / ``run_machine()``, plus engine modes) on every
+bundled program and on randomly generated valid programs, compares outputs
+and final memory with the reference engine (day09) and records the time
+taken by each engine.
+
+Day02's engine only supports ADD, MULTIPLY and HALT (in quartets, without
+parameter modes or I/O), so it only runs the cases in that format. The
+``-resume`` engine feeds its input one value at a time: the machine blocks
+(i.e. the channel raises ``StopIteration``) before every value and is
+resumed, re-executing the INPUT.
+
+Excluded on purpose:
+
+* Day13's ``run_machine()``, since day13's ``run_intcode()`` is a thin
+  wrapper around it.
+* Wrappers that drive an engine in a fixed way (e.g. day07's
+  ``run_sequence()`` or day21's ``run_springscript()``), since they run
+  one of the engines above and can't take an arbitrary program and I/O.
+"""
+
+import argparse
+import collections
+import functools
+import importlib.util
+import json
+import random
+import sys
+import time
+
+import main as day09
+
+ROOT = day09.HERE.parent
+FEATURE_OPCODES = "opcodes"  # More than ADD, MULTIPLY and HALT quartets
+FEATURE_RELATIVE = "relative"  # ADJUST_BASE and relative mode parameters
+FEATURE_GROWTH = "growth"  # Memory accesses past the end of the program
+DATA_SIZE = 16
+FAR_OFFSET = 1000
+NUM_BLOCKS = 8
+NUM_FUNCTIONS = 2
+MAX_LOOP_COUNT = 40
+Engine = collections.namedtuple(
+    "Engine", ["name", "run", "memory_kind", "features"]
+)
+Case = collections.namedtuple(
+    "Case", ["name", "program", "features", "make_io"]
+)
+
+
+def load_module(day):
+    spec = importlib.util.spec_from_file_location(day, ROOT / day / "main.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_program(day):
+    return day09.load_program(ROOT / day / "input.txt").tolist()
+
+
+class TrickleInput:
+    """Input channel that blocks before every value.
+
+    Each ``next()`` that isn't preceded by :meth:`resume` raises
+    ``StopIteration`` (as an input channel that has run dry does).
+    """
+
+    def __init__(self, std_input):
+        self.std_input = std_input
+        self.ready = False
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.ready:
+            raise StopIteration
+
+        self.ready = False
+        try:
+            return next(self.std_input)
+        except StopIteration:
+            self.exhausted = True
+            raise
+
+    def resume(self):
+        self.ready = True
+
+
+def day02_runner(day02):
+    def run(program, std_input, std_output):
+        return day02.run_intcode(program)
+
+    return run
+
+
+def machine_runner(module, resume=False):
+    """Run a program on a day's ``Machine`` (via ``run_machine()``).
+
+    If the day has a ``CowMemory``, the program is used as its base image
+    and the merged memory is returned. If ``resume`` is set, the machine
+    blocks before every input value and is resumed.
+    """
+    cow_memory = getattr(module, "CowMemory", None)
+
+    def run(program, std_input, std_output):
+        if cow_memory is not None:
+            program = cow_memory(program)
+        machine = module.Machine(program)
+        if resume:
+            trickle = TrickleInput(std_input)
+            while True:
+                try:
+                    module.run_machine(machine, trickle, std_output)
+                    break
+                except StopIteration:
+                    if trickle.exhausted:
+                        raise
+                    trickle.resume()
+        else:
+            module.run_machine(machine, std_input, std_output)
+
+        if cow_memory is None:
+            return program
+        return {**program.base, **program.written}
+
+    return run
+
+
+def engines():
+    basic = frozenset([FEATURE_OPCODES])
+    all_features = frozenset(
+        [FEATURE_OPCODES, FEATURE_RELATIVE, FEATURE_GROWTH]
+    )
+    day = {
+        name: load_module(name)
+        for name in (
+            "day02",
+            "day05",
+            "day07",
+            "day11",
+            "day13",
+            "day15",
+            "day17",
+            "day19",
+            "day21",
+            "day23",
+            "day25",
+        )
+    }
+    run_day09 = day09.run_intcode
+    return (
+        Engine("day09", run_day09, "dict", all_features),
+        Engine("day02", day02_runner(day["day02"]), "list", frozenset()),
+        Engine("day05", day["day05"].run_intcode, "list", basic),
+        Engine("day07", day["day07"].run_intcode, "list", basic),
+        Engine(
+            "day09-int64",
+            functools.partial(run_day09, fixed_width=True),
+            "dict",
+            all_features,
+        ),
+        Engine(
+            "day09-loops",
+            functools.partial(run_day09, loop_idioms=True),
+            "dict",
+            all_features,
+        ),
+        Engine(
+            "day09-trace",
+            functools.partial(run_day09, trace=True),
+            "dict",
+            all_features,
+        ),
+        Engine(
+            "day09-memo",
+            functools.partial(run_day09, memoize=True),
+            "dict",
+            all_features,
+        ),
+        Engine("day11", day["day11"].run_intcode, "dict", all_features),
+        Engine("day13", day["day13"].run_intcode, "dict", all_features),
+        Engine("day15", machine_runner(day["day15"]), "cow", all_features),
+        Engine("day17", machine_runner(day["day17"]), "dict", all_features),
+        Engine("day19", machine_runner(day["day19"]), "cow", all_features),
+        Engine("day21", machine_runner(day["day21"]), "dict", all_features),
+        Engine("day23", machine_runner(day["day23"]), "dict", all_features),
+        Engine("day25", machine_runner(day["day25"]), "cow", all_features),
+        Engine(
+            "day25-resume",
+            machine_runner(day["day25"], resume=True),
+            "cow",
+            all_features,
+        ),
+    )
+
+
+def list_io(input_values):
+    def make_io():
+        std_output = []
+        return iter(input_values), std_output, lambda: std_output
+
+    return make_io
+
+
+def robot_io(day11, start_color):
+    def make_io():
+        robot = day11.FastRobot(start_color)
+        return robot, robot, lambda: sorted(robot.painted_panels())
+
+    return make_io
+
+
+def as_memory(program, memory_kind):
+    if memory_kind == "list":
+        return list(program)
+    if memory_kind == "cow":
+        # NOTE: The base image of a ``CowMemory`` (see ``machine_runner()``).
+        return dict(enumerate(program))
+    return collections.defaultdict(int, enumerate(program))
+
+
+def nonzero_memory(memory):
+    if isinstance(memory, list):
+        items = enumerate(memory)
+    else:
+        items = memory.items()
+    return {index: value for index, value in items if value != 0}
+
+
+def run_case(engine, case):
+    """Run a case on an engine; returns ``(outcome, seconds)``.
+
+    The outcome is the output, the final memory and the name of the
+    exception raised (if any).
+    """
+    std_input, std_output, get_output = case.make_io()
+    program = as_memory(case.program, engine.memory_kind)
+    start = time.perf_counter()
+    error = None
+    memory = {}
+    try:
+        memory = engine.run(program, std_input, std_output)
+    except Exception as exc:
+        error = type(exc).__name__
+    duration = time.perf_counter() - start
+    return (get_output(), nonzero_memory(memory), error), duration
+
+
+def overflow_program():
+    return [
+        *(1102, 2**62, 4, 13),  # [13] <- 2^62 * 4 (does not fit in int64)
+        *(1001, 13, -1, 14),  # [14] <- [13] - 1
+        *(4, 13, 4, 14),  # Output [13] and [14]
+        99,
+        *(0, 0),  # Data
+    ]
+
+
+def counted_loop_program():
+    return [
+        *(3, 28),  # [28] <- n
+        *(1001, 29, 3, 29),  # [29] <- [29] + 3
+        *(1002, 30, -1, 30),  # [30] <- [30] * -1
+        *(1001, 31, 1, 31),  # [31] <- [31] + 1
+        *(7, 31, 28, 32),  # [32] <- [31] < [28]
+        *(1005, 32, 2),  # Loop while [32] != 0
+        *(4, 29, 4, 30, 4, 31),  # Output [29], [30] and [31]
+        99,
+        *(0, 0, 1, 0, 0),  # Data
+    ]
+
+
+def bundled_cases():
+    day02 = load_program("day02")
+    for noun, verb in ((12, 2), (76, 10)):
+        name = f"day02 ({noun}, {verb})"
+        program = [day02[0], noun, verb] + day02[3:]
+        yield Case(name, program, frozenset(), list_io([]))
+
+    basic = frozenset([FEATURE_OPCODES])
+    yield Case("overflow", overflow_program(), basic, list_io([]))
+    for count in (5, 20000):
+        name = f"counted loop ({count})"
+        yield Case(name, counted_loop_program(), basic, list_io([count]))
+
+    day05 = load_program("day05")
+    for input_value in (1, 5):
+        name = f"day05 ({input_value})"
+        yield Case(name, day05, basic, list_io([input_value]))
+
+    day07 = load_program("day07")
+    for phase in range(5):
+        name = f"day07 (phase {phase})"
+        yield Case(name, day07, basic, list_io([phase, 0]))
+
+    relative = frozenset([FEATURE_OPCODES, FEATURE_RELATIVE, FEATURE_GROWTH])
+    day09_program = load_program("day09")
+    for input_value in (1, 2):
+        name = f"day09 ({input_value})"
+        yield Case(name, day09_program, relative, list_io([input_value]))
+
+    day11 = load_module("day11")
+    day11_program = load_program("day11")
+    for start_color in (0, 1):
+        name = f"day11 (start {start_color})"
+        make_io = robot_io(day11, start_color)
+        yield Case(name, day11_program, relative, make_io)
+
+    day13 = load_program("day13")
+    yield Case("day13 (part 1)", day13, relative, list_io([]))
+    with open(ROOT / "day13" / "moves.json", "r") as file_obj:
+        moves = json.load(file_obj)
+    day13 = [2] + day13[1:]  # Number of quarters
+    yield Case("day13 (part 2)", day13, relative, list_io(moves))
+
+
+class ProgramBuilder:
+    """Generates random, valid, terminating Intcode programs.
+
+    The program is a series of blocks (followed by a HALT). Jumps between
+    blocks only go forward to the start of a later block. A block may also
+    contain a counted loop, i.e. a backward jump to the loop header that is
+    taken while a counter (in a cell that no other instruction writes) has
+    not run out, so every program terminates. When relative mode is
+    enabled, each block starts and ends with an ADJUST_BASE so the relative
+    base is known statically within a block, and blocks may call
+    subroutines (placed after the HALT). A call stores the return address
+    and jumps to the subroutine, which moves the relative base to a new
+    frame on entry, moves it back and returns with an indirect jump through
+    the stored address.
+
+    Parameters refer to symbolic data cells (or blocks and subroutines)
+    until the code length is known and the program is assembled. Cells
+    past the first ``DATA_SIZE`` are reserved for loop counters, induction
+    variables and the return address, so random operations never write
+    them.
+    """
+
+    def __init__(self, rng, features):
+        self.rng = rng
+        self.relative = FEATURE_RELATIVE in features
+        self.growth = FEATURE_GROWTH in features
+        self.code = []
+        self.block_starts = []
+        self.relative_base = 0
+        self.num_inputs = 0
+        # The number of times the code being emitted runs (i.e. inside a
+        # loop), so that there are enough input values.
+        self.repeat = 1
+        self.num_reserved = 0
+        self.return_cell = self.reserved_cell()
+        self.functions = []
+        self.function_inputs = []
+
+    def data_cell(self):
+        cell = self.rng.randrange(DATA_SIZE)
+        if self.growth and self.rng.random() < 0.25:
+            cell += FAR_OFFSET
+        return cell
+
+    def reserved_cell(self):
+        cell = DATA_SIZE + self.num_reserved
+        self.num_reserved += 1
+        assert cell < FAR_OFFSET
+        return cell
+
+    def read_param(self, allow_immediate=True):
+        choices = ["0"]
+        if allow_immediate:
+            choices.append("1")
+        if self.relative:
+            choices.append("2")
+        mode = self.rng.choice(choices)
+        if mode == "1":
+            return mode, self.rng.randint(-50, 50)
+        if mode == "2":
+            return mode, ("relative", self.data_cell(), self.relative_base)
+        return mode, ("data", self.data_cell())
+
+    def write_param(self):
+        return self.read_param(allow_immediate=False)
+
+    def cell_param(self, cell):
+        if self.relative and self.rng.random() < 0.5:
+            return "2", ("relative", cell, self.relative_base)
+        return "0", ("data", cell)
+
+    def emit(self, op_code, *mode_params):
+        modes = "".join(mode for mode, _ in reversed(mode_params))
+        instruction = op_code + 100 * int(modes or "0")
+        self.code.append(instruction)
+        self.code.extend(param for _, param in mode_params)
+
+    def emit_operation(self):
+        kind = self.rng.choice(["binary", "binary", "multiply", "io"])
+        if kind == "binary":
+            op_code = self.rng.choice([1, 7, 8])
+            params = (self.read_param(), self.read_param(), self.write_param())
+            self.emit(op_code, *params)
+        elif kind == "multiply":
+            # Keep one factor small so values do not explode.
+            factor = ("1", self.rng.randint(-9, 9))
+            self.emit(2, self.read_param(), factor, self.write_param())
+        elif self.rng.random() < 0.5:
+            self.emit(3, self.write_param())
+            self.num_inputs += self.repeat
+        else:
+            self.emit(4, self.read_param())
+
+    def emit_update(self):
+        """Emit an update of a fresh induction variable in a loop body.
+
+        These are the updates a counted loop can be collapsed with: a
+        constant step, a constant factor or a loop invariant value.
+        """
+        cell = self.cell_param(self.reserved_cell())
+        kind = self.rng.choice(["step", "step", "factor", "invariant"])
+        if kind == "step":
+            step = "1", self.rng.randint(-9, 9)
+            self.emit(1, *self.rng.sample([cell, step], 2), cell)
+        elif kind == "factor":
+            self.emit(2, cell, ("1", self.rng.choice([-1, 2])), cell)
+        else:
+            self.emit(1, self.read_param(), ("1", 0), cell)
+
+    def emit_call(self):
+        function_index = self.rng.randrange(len(self.functions))
+        return_index = len(self.code) + 7
+        return_param = "0", ("data", self.return_cell)
+        self.emit(1, ("1", 0), ("1", return_index), return_param)
+        self.emit(5, ("1", 1), ("1", ("function", function_index)))
+        self.num_inputs += self.repeat * self.function_inputs[function_index]
+
+    def emit_loop(self, emit_body):
+        """Emit a counted loop, running ``emit_body`` in every iteration."""
+        count = self.rng.randint(1, MAX_LOOP_COUNT)
+        counter = self.reserved_cell()
+        count_down = self.rng.random() < 0.5
+        initial = count if count_down else 0
+        self.emit(1, ("1", 0), ("1", initial), self.cell_param(counter))
+
+        header = len(self.code)
+        self.repeat = count
+        emit_body()
+        self.repeat = 1
+
+        param = self.cell_param(counter)
+        if count_down:
+            self.emit(1, param, ("1", -1), param)
+            self.emit(5, self.cell_param(counter), ("1", header))
+        else:
+            flag = self.cell_param(self.reserved_cell())
+            self.emit(1, param, ("1", 1), param)
+            self.emit(7, self.cell_param(counter), ("1", count), flag)
+            self.emit(5, flag, ("1", header))
+
+    def emit_loop_body(self):
+        if self.rng.random() < 0.5:
+            for _ in range(self.rng.randint(1, 4)):
+                self.emit_update()
+        else:
+            for _ in range(self.rng.randint(1, 4)):
+                self.emit_operation()
+
+    def emit_function(self):
+        """Emit a subroutine into its own code (placed after the HALT)."""
+        code, self.code = self.code, []
+        num_inputs, self.num_inputs = self.num_inputs, 0
+        # Calls are made at relative base 0, so this is known statically.
+        self.relative_base = self.rng.randint(1, DATA_SIZE)
+        self.emit(9, ("1", self.relative_base))
+        for _ in range(self.rng.randint(1, 6)):
+            self.emit_operation()
+        self.emit(9, ("1", -self.relative_base))
+        self.relative_base = 0
+        self.emit(5, ("1", 1), self.cell_param(self.return_cell))
+
+        self.functions.append(self.code)
+        self.function_inputs.append(self.num_inputs)
+        self.code = code
+        self.num_inputs = num_inputs
+
+    def emit_block(self, block_index):
+        self.block_starts.append(len(self.code))
+        if self.relative:
+            self.relative_base = self.rng.randrange(-DATA_SIZE, DATA_SIZE)
+            self.emit(9, ("1", self.relative_base))
+
+        for _ in range(self.rng.randint(2, 8)):
+            self.emit_operation()
+        if self.rng.random() < 0.5:
+            self.emit_loop(self.emit_loop_body)
+
+        if self.relative:
+            self.emit(9, ("1", -self.relative_base))
+            self.relative_base = 0
+            if self.rng.random() < 0.25:
+                self.emit_loop(self.emit_call)
+            elif self.rng.random() < 0.5:
+                self.emit_call()
+
+        if self.rng.random() < 0.5:
+            op_code = self.rng.choice([5, 6])
+            target = self.rng.randint(block_index + 1, NUM_BLOCKS)
+            self.emit(op_code, self.read_param(), ("1", ("block", target)))
+
+    def build(self):
+        if self.relative:
+            for _ in range(NUM_FUNCTIONS):
+                self.emit_function()
+        for block_index in range(NUM_BLOCKS):
+            self.emit_block(block_index)
+        # The final "block" just halts.
+        self.block_starts.append(len(self.code))
+        self.code.append(99)
+
+        function_starts = []
+        for function in self.functions:
+            function_starts.append(len(self.code))
+            self.code.extend(function)
+
+        data_start = len(self.code)
+        program = []
+        for value in self.code:
+            if isinstance(value, tuple):
+                kind, *args = value
+                if kind == "data":
+                    cell, = args
+                    value = data_start + cell
+                elif kind == "relative":
+                    cell, relative_base = args
+                    value = data_start + cell - relative_base
+                elif kind == "function":
+                    function_index, = args
+                    value = function_starts[function_index]
+                else:
+                    block_index, = args
+                    value = self.block_starts[block_index]
+            program.append(value)
+
+        num_cells = DATA_SIZE + self.num_reserved
+        program.extend(self.rng.randint(-100, 100) for _ in range(num_cells))
+        inputs = [self.rng.randint(-100, 100) for _ in range(self.num_inputs)]
+        return program, inputs
+
+
+def quartet_program(rng):
+    """Generate a random ADD / MULTIPLY program in day02's format.
+
+    The program is a series of quartets followed by a HALT and the data.
+    Any cell (including code) may be read, but only the data is written,
+    so the program always reaches the HALT.
+    """
+    num_quartets = rng.randint(1, 2 * NUM_BLOCKS)
+    data_start = 4 * num_quartets + 1
+    size = data_start + DATA_SIZE
+    program = []
+    for _ in range(num_quartets):
+        op_code = rng.choice([1, 2])
+        inputs = rng.randrange(size), rng.randrange(size)
+        program.extend([op_code, *inputs, rng.randrange(data_start, size)])
+    program.append(99)
+    program.extend(rng.randint(-100, 100) for _ in range(DATA_SIZE))
+    return program
+
+
+def random_cases(num_programs, seed):
+    rng = random.Random(seed)
+    for i in range(num_programs // 4):
+        program = quartet_program(rng)
+        yield Case(f"quartet-{i}", program, frozenset(), list_io([]))
+
+    feature_sets = (
+        frozenset([FEATURE_OPCODES]),
+        frozenset([FEATURE_OPCODES, FEATURE_RELATIVE]),
+        frozenset([FEATURE_OPCODES, FEATURE_RELATIVE, FEATURE_GROWTH]),
+    )
+    for i in range(num_programs):
+        features = feature_sets[i % len(feature_sets)]
+        program, inputs = ProgramBuilder(rng, features).build()
+        yield Case(f"random-{i}", program, features, list_io(inputs))
+
+
+def check_cases(all_engines, cases, verbose):
+    reference, *others = all_engines
+    totals = collections.Counter()
+    failures = []
+    for case in cases:
+        expected, duration = run_case(reference, case)
+        totals[reference.name] += duration
+        row = [f"{duration:8.4f}"]
+        for engine in others:
+            if not case.features <= engine.features:
+                row.append(f"{'-':>8}")
+                continue
+
+            outcome, duration = run_case(engine, case)
+            totals[engine.name] += duration
+            if outcome == expected:
+                row.append(f"{duration:8.4f}")
+            else:
+                row.append(f"{'FAIL':>8}")
+                failures.append((case.name, engine.name))
+
+        if verbose:
+            print(f"{case.name:<20}" + " ".join(row))
+
+    return totals, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num-random", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--quiet", action="store_true", help="Only print the summary"
+    )
+    args = parser.parse_args()
+
+    all_engines = engines()
+    print(f"{'case':<20}" + " ".join(f"{e.name:>8}" for e in all_engines))
+
+    all_totals = collections.Counter()
+    all_failures = []
+    for cases in (
+        bundled_cases(),
+        random_cases(args.num_random, args.seed),
+    ):
+        totals, failures = check_cases(all_engines, cases, not args.quiet)
+        all_totals.update(totals)
+        all_failures.extend(failures)
+
+    print("Total seconds per engine:")
+    for engine in all_engines:
+        print(f"  {engine.name:<12} {all_totals[engine.name]:.4f}")
+
+    if all_failures:
+        for case_name, engine_name in all_failures:
+            print(f"MISMATCH: {engine_name} on {case_name}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,12 +10,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
 import collections
 import copy
 import operator
 import pathlib
 import uuid
 
+import numpy as np
+
 
 HERE = pathlib.Path(__file__).resolve().parent
 OPCODES = {
@@ -36,6 +39,71 @@ RELATIVE_MODE = "2"
 ALL_MODES = set("012")
 NO_JUMP_JUMP_INDEX = uuid.uuid4()
 TERMINAL_JUMP_INDEX = uuid.uuid4()
+INT64_MIN = -(2 ** 63)
+INT64_MAX = 2 ** 63 - 1
+LOOP_HOT_THRESHOLD = 8
+LOOP_MAX_POWER = 4096
+PLAIN_OPCODES = {1: "ADD", 2: "MULTIPLY", 7: "LESS-THAN", 8: "EQUALS"}
+TRACE_HOT_THRESHOLD = 16
+TRACE_MAX_LENGTH = 1000
+TRACE_MAX_ATTEMPTS = 3
+WRITE_INSTRUCTIONS = ("ADD", "MULTIPLY", "LESS-THAN", "EQUALS", "INPUT")
+MEMO_MAX_ENTRIES = 65536
+MEMO_MAX_SIGNATURES = 8
+TRACE_BINARY_OPS = {
+    "ADD": "{} + {}",
+    "MULTIPLY": "{} * {}",
+    "LESS-THAN": "1 if {} < {} else 0",
+    "EQUALS": "1 if {} == {} else 0",
+}
+
+
+class Int64Memory:
+    """Intcode memory stored as a growable ``int64`` array.
+
+    Arithmetic is still done on Python ``int``-s, so every store is checked:
+    a value that does not fit in ``int64`` is "promoted" into a side table
+    of arbitrary precision values (which takes precedence over the array).
+    """
+
+    def __init__(self, program):
+        self.values = np.zeros(max(program, default=-1) + 1, dtype=np.int64)
+        self.view = memoryview(self.values)
+        self.promoted = {}
+        for index, value in program.items():
+            self[index] = value
+
+    def __getitem__(self, index):
+        if self.promoted and index in self.promoted:
+            return self.promoted[index]
+        if index < len(self.view):
+            return self.view[index]
+        return 0
+
+    def __setitem__(self, index, value):
+        if INT64_MIN <= value <= INT64_MAX:
+            if index >= len(self.view):
+                self.grow(index + 1)
+            self.view[index] = value
+            if self.promoted:
+                self.promoted.pop(index, None)
+        else:
+            self.promoted[index] = value
+            if index < len(self.view):
+                self.view[index] = 0
+
+    def grow(self, min_size):
+        size = max(min_size, 2 * len(self.values))
+        values = np.zeros(size, dtype=np.int64)
+        values[: len(self.values)] = self.values
+        self.values = values
+        self.view = memoryview(values)
+
+    def items(self):
+        for index in np.flatnonzero(self.values).tolist():
+            if index not in self.promoted:
+                yield index, self.view[index]
+        yield from self.promoted.items()
 
 
 class AdjustBase:
@@ -242,16 +310,731 @@ def execute_instruction(
     raise ValueError("Bad instruction", instruction, modes, params, program)
 
 
-def run_intcode(program, std_input, std_output):
-    relative_base = 0
-    running_program = copy.deepcopy(program)
+def _plain_instruction(index, program):
+    """Decode an arithmetic / comparison instruction, or return :data:`None`.
+
+    This is used to decode code that has not been executed yet, so (unlike
+    :func:`next_instruction`) invalid instructions are not an error.
+    """
+    mode_as_int, op_code = divmod(program[index], 100)
+    if op_code not in PLAIN_OPCODES or not 0 <= mode_as_int < 1000:
+        return None
+    modes = tuple(reversed(str(mode_as_int).zfill(3)))
+    if not set(modes) <= ALL_MODES or modes[2] == IMMEDIATE_MODE:
+        return None
+    params = tuple(program[i] for i in range(index + 1, index + 4))
+    return PLAIN_OPCODES[op_code], modes, params, index + 4
 
+
+def _address(mode, param, relative_base):
+    if mode == RELATIVE_MODE:
+        return relative_base + param
+    return param
+
+
+def _symbolic_binary_op(instruction, expr1, expr2):
+    """Combine two symbolic values from a loop body.
+
+    A symbolic value is one of ``("const", value)`` (loop invariant),
+    ``("lin", cell, offset)`` (the value of ``cell`` at the start of the
+    iteration plus ``offset``), ``("scale", cell, factor)`` (the value of
+    ``cell`` at the start of the iteration times ``factor``) or
+    ``("cmp", instruction, expr1, expr2)``. Returns :data:`None` if the
+    result can't be represented.
+    """
+    if expr1[0] == "const" and expr2[0] == "const":
+        if instruction == "ADD":
+            return "const", expr1[1] + expr2[1]
+        if instruction == "MULTIPLY":
+            return "const", expr1[1] * expr2[1]
+        if instruction == "LESS-THAN":
+            return "const", less_than_binary_op(expr1[1], expr2[1])
+        return "const", equal_binary_op(expr1[1], expr2[1])
+
+    if instruction in ("LESS-THAN", "EQUALS"):
+        kinds = sorted([expr1[0], expr2[0]])
+        if kinds == ["const", "lin"]:
+            return "cmp", instruction, expr1, expr2
+        return None
+
+    if expr1[0] == "const":
+        expr1, expr2 = expr2, expr1
+    if expr2[0] != "const":
+        return None
+
+    kind, cell, value = expr1
+    if instruction == "ADD" and kind == "lin":
+        return "lin", cell, value + expr2[1]
+    if instruction == "MULTIPLY" and kind == "lin" and value == 0:
+        return "scale", cell, expr2[1]
+    if instruction == "MULTIPLY" and kind == "scale":
+        return "scale", cell, value * expr2[1]
+
+    return None
+
+
+def _exit_iteration(continues, c, d):
+    """Find the first ``t >= 0`` where a loop stops iterating.
+
+    The loop continues after iteration ``t`` when ``c + d t`` satisfies
+    ``continues`` (one of ``"negative"``, ``"zero"`` or ``"nonzero"``).
+    Returns :data:`None` if the loop never exits.
+    """
+    if continues == "negative":
+        if c >= 0:
+            return 0
+        if d <= 0:
+            return None
+        return (-c + d - 1) // d
+
+    if continues == "zero":
+        if c != 0:
+            return 0
+        if d == 0:
+            return None
+        return 1
+
+    if c == 0:
+        return 0
+    if d == 0 or (-c) % d != 0 or (-c) // d < 0:
+        return None
+    return (-c) // d
+
+
+def analyze_counted_loop(header, back_edge, relative_base, program):
+    """Find the closed form of a counted loop.
+
+    The loop body must be straight-line code from ``header`` to a
+    conditional jump (at ``back_edge``) back to ``header``, using only
+    ADD, MULTIPLY, LESS-THAN and EQUALS. Every cell written must be
+    updated by a constant step (``x += c``), a constant factor (``x *= c``)
+    or set to a loop invariant, and the loop condition must compare one
+    induction variable with a loop invariant. I/O, ADJUST_BASE, jumps within
+    the body or writes into the loop's own code all rule a loop out.
+
+    This is called after a back edge has been taken, i.e. at the start of
+    an iteration. Returns :data:`None` if the loop is not a counted loop,
+    otherwise a triple of the index of the instruction after the loop, the
+    values to store (once the loop is done) and the number of instructions
+    this replaces.
+    """
+    body = []
+    index = header
+    while index < back_edge:
+        decoded = _plain_instruction(index, program)
+        if decoded is None:
+            return None
+        instruction, modes, params, index = decoded
+        body.append((instruction, modes, params))
+    if index != back_edge:
+        return None
+
+    instruction, modes, params, loop_exit = next_instruction(
+        back_edge, program
+    )
+    if instruction not in ("JUMP-IF-TRUE", "JUMP-IF-FALSE"):
+        return None
+
+    written = set()
+    for _, body_modes, body_params in body:
+        target = _address(body_modes[2], body_params[2], relative_base)
+        if header <= target < loop_exit:
+            return None
+        written.add(target)
+
+    state = {}
+    entry_reads = set()
+
+    def symbolic_read(mode, param):
+        if mode == IMMEDIATE_MODE:
+            return "const", param
+        index = _address(mode, param, relative_base)
+        if index in state:
+            return state[index]
+        if index in written:
+            entry_reads.add(index)
+            return "lin", index, 0
+        return "const", program[index]
+
+    for body_instruction, body_modes, body_params in body:
+        expr1 = symbolic_read(body_modes[0], body_params[0])
+        expr2 = symbolic_read(body_modes[1], body_params[1])
+        if "cmp" in (expr1[0], expr2[0]):
+            return None
+        result = _symbolic_binary_op(body_instruction, expr1, expr2)
+        if result is None:
+            return None
+        state[_address(body_modes[2], body_params[2], relative_base)] = result
+
+    condition = symbolic_read(modes[0], params[0])
+    if symbolic_read(modes[1], params[1]) != ("const", header):
+        return None
+
+    # Each update must only depend on the previous value of the same cell
+    # (or nothing at all) and cells read before they are written must be
+    # updated the same way in every iteration.
+    for cell, expr in state.items():
+        if expr[0] in ("lin", "scale") and expr[1] != cell:
+            return None
+        if cell in entry_reads and expr[0] not in ("lin", "scale"):
+            return None
+
+    if condition[0] == "lin":
+        condition = "cmp", "NOT-EQUALS", condition, ("const", 0)
+    if condition[0] != "cmp":
+        # Either the loop never exits or the back edge is never taken again.
+        return None
+
+    _, compare, lhs, rhs = condition
+    lin_on_left = lhs[0] == "lin"
+    (_, cell, offset), (_, bound) = (lhs, rhs) if lin_on_left else (rhs, lhs)
+    if state[cell][0] != "lin":
+        return None
+    step = state[cell][2]
+    c = program[cell] + offset - bound
+    d = step
+    if compare == "LESS-THAN":
+        if not lin_on_left:
+            c, d = -c, -d
+        continues = "negative"
+        if instruction == "JUMP-IF-FALSE":
+            c, d = -c - 1, -d
+    else:
+        is_equal = compare == "EQUALS"
+        if is_equal == (instruction == "JUMP-IF-TRUE"):
+            continues = "zero"
+        else:
+            continues = "nonzero"
+
+    last = _exit_iteration(continues, c, d)
+    if last is None:
+        return None
+    iterations = last + 1
+
+    def value_at(expr, t):
+        if expr[0] == "const":
+            return expr[1]
+        _, lin_cell, lin_offset = expr
+        return program[lin_cell] + lin_offset + t * state[lin_cell][2]
+
+    updates = {}
+    for cell, expr in state.items():
+        kind = expr[0]
+        if kind == "const":
+            updates[cell] = expr[1]
+        elif kind == "lin":
+            updates[cell] = program[cell] + iterations * expr[2]
+        elif kind == "scale":
+            factor = expr[2]
+            if abs(factor) > 1 and iterations > LOOP_MAX_POWER:
+                return None
+            updates[cell] = program[cell] * factor ** iterations
+        else:
+            _, cmp_instruction, cmp_lhs, cmp_rhs = expr
+            for operand in (cmp_lhs, cmp_rhs):
+                if operand[0] == "lin" and state[operand[1]][0] != "lin":
+                    return None
+            updates[cell] = _symbolic_binary_op(
+                cmp_instruction,
+                ("const", value_at(cmp_lhs, last)),
+                ("const", value_at(cmp_rhs, last)),
+            )[1]
+
+    return loop_exit, updates, iterations * (len(body) + 1)
+
+
+class LoopIdioms:
+    """Profile back edges and collapse hot counted loops."""
+
+    def __init__(self, counters=None):
+        self.counters = counters
+        self.back_edges = collections.Counter()
+        self.not_counted = set()
+
+    def back_edge(self, header, back_edge, relative_base, program):
+        """Record a taken back edge; returns the index to continue from."""
+        key = header, back_edge, relative_base
+        self.back_edges[key] += 1
+        if self.back_edges[key] < LOOP_HOT_THRESHOLD:
+            return header
+        if key in self.not_counted:
+            return header
+
+        loop = analyze_counted_loop(header, back_edge, relative_base, program)
+        if loop is None:
+            self.not_counted.add(key)
+            return header
+
+        loop_exit, updates, num_collapsed = loop
+        for cell, value in updates.items():
+            program[cell] = value
+        if self.counters is not None:
+            self.counters["collapsed"] += num_collapsed
+        return loop_exit
+
+
+def _trace_address(mode, param):
+    if mode == RELATIVE_MODE:
+        return f"relative_base + {param}"
+    return param
+
+
+def _trace_value(mode, param):
+    if mode == IMMEDIATE_MODE:
+        return param
+    return f"memory[{_trace_address(mode, param)}]"
+
+
+def trace_source(header, steps, dynamic):
+    """Generate the source of a compiled trace.
+
+    Each step is an executed instruction, as a tuple of its index,
+    instruction, modes, parameters and the index of the instruction
+    executed after it. The last step must jump back to ``header``.
+    Parameters are inlined, except for those stored in a ``dynamic`` cell
+    (i.e. one the program writes to), which are read when the trace runs.
+
+    The generated function loops until a guard fails (i.e. a jump goes
+    another way than when the trace was recorded) or until the trace writes
+    into an inlined cell (``code_cells``). It returns the index to continue
+    from, the relative base, the number of instructions executed and the
+    code cell written (or :data:`None`).
+    """
+    lines = [
+        f"def trace_{header}(",
+        "    memory, relative_base, std_input, std_output, code_cells",
+        "):",
+        "    executed = 0",
+        "    while True:",
+    ]
+    for count, step in enumerate(steps, 1):
+        start, instruction, modes, params, next_index = step
+        fallthrough = start + 1 + len(params)
+        exit_suffix = f", relative_base, executed + {count}, None"
+        lines.append(f"        # {start}: {instruction} {params}")
+        params = [
+            f"memory[{cell}]" if cell in dynamic else str(param)
+            for cell, param in enumerate(params, start + 1)
+        ]
+
+        if instruction in WRITE_INSTRUCTIONS:
+            lines.append(
+                f"        address = {_trace_address(modes[-1], params[-1])}"
+            )
+            if instruction == "INPUT":
+                value = "next(std_input)"
+            else:
+                value = TRACE_BINARY_OPS[instruction].format(
+                    _trace_value(modes[0], params[0]),
+                    _trace_value(modes[1], params[1]),
+                )
+            lines.extend(
+                [
+                    f"        memory[address] = {value}",
+                    "        if address in code_cells:",
+                    f"            return {fallthrough}, relative_base, "
+                    f"executed + {count}, address",
+                ]
+            )
+        elif instruction == "OUTPUT":
+            value = _trace_value(modes[0], params[0])
+            lines.append(f"        std_output.append({value})")
+        elif instruction == "ADJUST_BASE":
+            value = _trace_value(modes[0], params[0])
+            lines.append(f"        relative_base += {value}")
+        else:
+            condition = _trace_value(modes[0], params[0])
+            target = _trace_value(modes[1], params[1])
+            if instruction == "JUMP-IF-FALSE":
+                condition = f"not {condition}"
+            if next_index == fallthrough:
+                lines.extend(
+                    [
+                        f"        if {condition}:",
+                        f"            return {target}{exit_suffix}",
+                    ]
+                )
+            else:
+                lines.extend(
+                    [
+                        f"        if not ({condition}):",
+                        f"            return {fallthrough}{exit_suffix}",
+                    ]
+                )
+                if target != str(next_index):
+                    lines.extend(
+                        [
+                            f"        target = {target}",
+                            f"        if target != {next_index}:",
+                            f"            return target{exit_suffix}",
+                        ]
+                    )
+
+    lines.append(f"        executed += {len(steps)}")
+    return "\n".join(lines) + "\n"
+
+
+def compile_trace(header, steps, dynamic):
+    source = trace_source(header, steps, dynamic)
+    namespace = {}
+    exec(compile(source, f"<trace {header}>", "exec"), namespace)
+    return namespace[f"trace_{header}"]
+
+
+class Tracer:
+    """Record and compile traces of hot loops (i.e. a tracing JIT).
+
+    Once a back edge to ``header`` has been taken
+    :data:`TRACE_HOT_THRESHOLD` times, the instructions executed until
+    control gets back to ``header`` are recorded and compiled with
+    :func:`compile_trace`. Later back edges to ``header`` run the compiled
+    trace instead of the interpreter.
+
+    Intcode programs often keep variables in the parameters of their own
+    instructions, so parameters that have been seen to change are marked
+    as ``dynamic`` and read from memory by the trace. Traces are dropped
+    when any other code cell (i.e. an op code or an inlined parameter) is
+    written to.
+    """
+
+    def __init__(self, counters=None):
+        self.counters = counters
+        self.hot = collections.Counter()
+        self.attempts = collections.Counter()
+        self.traces = {}
+        self.trace_cells = {}
+        self.code_cells = set()
+        self.dynamic = set()
+        self.recording = None
+        self.steps = []
+
+    def back_edge(self, header, relative_base, program, std_input, std_output):
+        """Record a taken back edge.
+
+        Returns the index to continue from and the relative base.
+        """
+        if self.recording is not None:
+            return header, relative_base
+
+        trace = self.traces.get(header)
+        if trace is None:
+            self.hot[header] += 1
+            if (
+                self.hot[header] >= TRACE_HOT_THRESHOLD
+                and self.attempts[header] < TRACE_MAX_ATTEMPTS
+            ):
+                self.attempts[header] += 1
+                self.recording = header
+                self.steps = []
+            return header, relative_base
+
+        index, relative_base, executed, written = trace(
+            program, relative_base, std_input, std_output, self.code_cells
+        )
+        if self.counters is not None:
+            self.counters["traced"] += executed
+        if written is not None:
+            self.invalidate(written)
+        return index, relative_base
+
+    def record(self, start, instruction, modes, params, next_index, program):
+        if instruction == "HALT" or len(self.steps) >= TRACE_MAX_LENGTH:
+            self.recording = None
+            return
+
+        self.steps.append((start, instruction, modes, params, next_index))
+        if next_index != self.recording:
+            return
+
+        header = self.recording
+        self.recording = None
+        cells = set()
+        for start, instruction, modes, params, _ in self.steps:
+            decoded = next_instruction(start, program)
+            if decoded[:2] != (instruction, modes):
+                # Give up if an op code was modified after it was recorded.
+                return
+            cells.add(start)
+            for cell, param in enumerate(params, start + 1):
+                if program[cell] != param:
+                    self.dynamic.add(cell)
+                if cell not in self.dynamic:
+                    cells.add(cell)
+
+        self.traces[header] = compile_trace(header, self.steps, self.dynamic)
+        self.trace_cells[header] = cells
+        self.code_cells.update(cells)
+
+    def check_write(self, mode, param, relative_base):
+        """Drop traces when an interpreted instruction writes into them."""
+        address = param
+        if mode == RELATIVE_MODE:
+            address += relative_base
+        if address in self.code_cells:
+            self.invalidate(address)
+
+    def invalidate(self, address):
+        for header, cells in list(self.trace_cells.items()):
+            if address in cells:
+                del self.traces[header]
+                del self.trace_cells[header]
+                self.hot[header] = 0
+
+        # If this is a parameter, the next trace will read it from memory.
+        self.dynamic.add(address)
+        self.code_cells.clear()
+        for cells in self.trace_cells.values():
+            self.code_cells.update(cells)
+
+
+class CallFrame:
+    """The reads and writes of a subroutine call being recorded."""
+
+    def __init__(self, function, base, start):
+        self.function = function
+        self.base = base
+        self.start = start
+        # Both map address -> is_relative; ``reads`` also has the value read.
+        # These are the cells read before they are written (in order), i.e.
+        # the inputs of the call, and the cells written by the call.
+        self.reads = {}
+        self.written = {}
+
+
+class CallMemo:
+    """Memoize calls to pure Intcode subroutines.
+
+    A call is a jump to an instruction that pushes a stack frame (i.e. an
+    ``ADJUST_BASE`` by a positive constant); the call returns with an
+    indirect jump once the relative base is back where it was at the call.
+    While a call runs, the cells it reads before writing and the cells it
+    writes are recorded. The result of a call is cached in an LRU keyed by
+    the values of its inputs, so a later call with the same inputs just
+    stores the same values and returns.
+
+    A call is pure (i.e. can be cached) if it does no I/O and does not
+    write into code. Writes are replayed, so writes outside of the frame
+    (e.g. to a scratch cell) are fine, unless the same cell is accessed
+    both relative to the base and by its absolute address; a cached result
+    would then depend on where the frame is.
+    """
+
+    def __init__(self, counters=None):
+        self.counters = counters
+        self.clock = 0
+        self.frames = []
+        self.signatures = collections.defaultdict(list)
+        self.entries = collections.OrderedDict()
+        self.code_cells = set()
+
+    def access(
+        self, start, instruction, modes, params, relative_base, program
+    ):
+        """Record the memory accesses of an instruction (before it runs)."""
+        self.clock += 1
+        is_write = instruction in WRITE_INSTRUCTIONS
+        if is_write and self.code_cells:
+            address = _address(modes[-1], params[-1], relative_base)
+            if address in self.code_cells:
+                self.clear()
+        if not self.frames:
+            return
+
+        frame = self.frames[-1]
+        if instruction in ("INPUT", "OUTPUT") or relative_base < frame.base:
+            self.frames.clear()
+            return
+
+        self.code_cells.update(range(start, start + 1 + len(params)))
+        num_reads = len(params) - is_write
+        for mode, param in zip(modes[:num_reads], params):
+            if mode == IMMEDIATE_MODE:
+                continue
+            address = _address(mode, param, relative_base)
+            value = program[address]
+            is_relative = mode == RELATIVE_MODE
+            if not self.merge_read(frame, address, is_relative, value):
+                return
+
+        if is_write:
+            address = _address(modes[-1], params[-1], relative_base)
+            is_relative = modes[-1] == RELATIVE_MODE
+            self.merge_write(frame, address, is_relative)
+
+    def merge_read(self, frame, address, is_relative, value):
+        written = frame.written.get(address)
+        if written is None:
+            if address not in frame.reads:
+                frame.reads[address] = is_relative, value
+                return True
+            if frame.reads[address][0] == is_relative:
+                return True
+        elif written == is_relative:
+            return True
+
+        self.frames.clear()
+        return False
+
+    def merge_write(self, frame, address, is_relative):
+        written = frame.written.setdefault(address, is_relative)
+        if written != is_relative:
+            self.frames.clear()
+
+    def jumped(self, index, target_mode, relative_base, program):
+        """Handle a taken jump; returns the index to continue from."""
+        if self.frames and relative_base == self.frames[-1].base:
+            if target_mode == IMMEDIATE_MODE:
+                self.frames.clear()
+            else:
+                self.finish(index, program)
+
+        if program[index] != 109 or program[index + 1] <= 0:
+            return index
+
+        for signature in self.signatures.get(index, ()):
+            values = tuple(
+                program[relative_base + offset if is_relative else offset]
+                for is_relative, offset in signature
+            )
+            entry = self.entries.get((index, signature, values))
+            if entry is not None:
+                self.entries.move_to_end((index, signature, values))
+                return self.replay(
+                    relative_base, signature, values, entry, program
+                )
+
+        self.frames.append(CallFrame(index, relative_base, self.clock))
+        return index
+
+    def finish(self, return_index, program):
+        frame = self.frames.pop()
+        base = frame.base
+        signature = tuple(
+            (is_relative, address - base if is_relative else address)
+            for address, (is_relative, _) in frame.reads.items()
+        )
+        values = tuple(value for _, value in frame.reads.values())
+        writes = tuple(
+            (is_relative, address - base if is_relative else address)
+            for address, is_relative in frame.written.items()
+        )
+        written_values = tuple(program[address] for address in frame.written)
+        executed = self.clock - frame.start
+
+        signatures = self.signatures[frame.function]
+        if signature not in signatures:
+            if len(signatures) < MEMO_MAX_SIGNATURES:
+                signatures.append(signature)
+        if signature in signatures:
+            key = frame.function, signature, values
+            entry = writes, written_values, return_index, executed
+            self.entries[key] = entry
+            if len(self.entries) > MEMO_MAX_ENTRIES:
+                self.entries.popitem(last=False)
+
+        if self.frames:
+            self.merge_call(frame.reads, frame.written)
+
+    def replay(self, base, signature, values, entry, program):
+        writes, written_values, return_index, executed = entry
+        written = {}
+        for (is_relative, offset), value in zip(writes, written_values):
+            address = base + offset if is_relative else offset
+            program[address] = value
+            written[address] = is_relative
+        self.clock += executed
+        if self.counters is not None:
+            self.counters["memoized"] += executed
+
+        if self.frames:
+            reads = {}
+            for (is_relative, offset), value in zip(signature, values):
+                address = base + offset if is_relative else offset
+                reads[address] = is_relative, value
+            self.merge_call(reads, written)
+
+        return return_index
+
+    def merge_call(self, reads, written):
+        """Add the reads and writes of a call to the calling frame."""
+        frame = self.frames[-1]
+        for address, (is_relative, value) in reads.items():
+            if not self.merge_read(frame, address, is_relative, value):
+                return
+        for address, is_relative in written.items():
+            self.merge_write(frame, address, is_relative)
+
+    def clear(self):
+        """Drop everything, e.g. because a subroutine's code was changed."""
+        self.frames.clear()
+        self.signatures.clear()
+        self.entries.clear()
+        self.code_cells.clear()
+
+
+def run_intcode(
+    program,
+    std_input,
+    std_output,
+    fixed_width=False,
+    loop_idioms=False,
+    trace=False,
+    memoize=False,
+    counters=None,
+):
+    """Run an Intcode program.
+
+    If ``loop_idioms`` is set, hot back edges (i.e. backward jumps taken
+    at least :data:`LOOP_HOT_THRESHOLD` times) are checked for counted loops
+    and those are run in closed form. If ``trace`` is set, hot loops are
+    compiled into Python functions (see :class:`Tracer`). If ``memoize``
+    is set, the results of pure subroutine calls are cached (see
+    :class:`CallMemo`); this can't be combined with the other two, since
+    they run instructions without recording their memory accesses.
+
+    If ``counters`` (a :class:`collections.Counter`) is passed, the number
+    of instructions dispatched (``"instructions"``), replaced by collapsed
+    loops (``"collapsed"``), run in compiled traces (``"traced"``) and
+    skipped by cached calls (``"memoized"``) are added to it.
+    """
+    if memoize and (loop_idioms or trace):
+        raise ValueError(
+            "Call memoization can't be combined with other engine modes"
+        )
+
+    relative_base = 0
+    if fixed_width:
+        running_program = Int64Memory(program)
+    else:
+        running_program = copy.deepcopy(program)
+
+    loops = None
+    if loop_idioms:
+        loops = LoopIdioms(counters)
+    tracer = None
+    if trace:
+        tracer = Tracer(counters)
+    memo = None
+    if memoize:
+        memo = CallMemo(counters)
     jump_index = NO_JUMP_JUMP_INDEX
     index = 0
     while jump_index != TERMINAL_JUMP_INDEX:
+        if counters is not None:
+            counters["instructions"] += 1
+        start = index
         instruction, modes, params, index = next_instruction(
             index, running_program
         )
+        if memo is not None:
+            memo.access(
+                start,
+                instruction,
+                modes,
+                params,
+                relative_base,
+                running_program,
+            )
         jump_index = execute_instruction(
             instruction,
             modes,
@@ -261,6 +1044,11 @@ def run_intcode(program, std_input, std_output):
             std_input,
             std_output,
         )
+        if tracer is not None and tracer.code_cells:
+            if instruction in WRITE_INSTRUCTIONS:
+                tracer.check_write(modes[-1], params[-1], relative_base)
+
+        back_edge = False
         if isinstance(jump_index, AdjustBase):
             relative_base += jump_index.value
         elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
@@ -268,28 +1056,91 @@ def run_intcode(program, std_input, std_output):
             pass
         elif jump_index >= 0:
             index = jump_index
+            back_edge = jump_index <= start
+            if memo is not None:
+                index = memo.jumped(
+                    index, modes[1], relative_base, running_program
+                )
         else:
             raise ValueError("Invalid jump index", jump_index)
 
+        if tracer is not None and tracer.recording is not None:
+            tracer.record(
+                start, instruction, modes, params, index, running_program
+            )
+        if back_edge and loops is not None:
+            index = loops.back_edge(
+                jump_index, start, relative_base, running_program
+            )
+        if back_edge and tracer is not None and index == jump_index:
+            index, relative_base = tracer.back_edge(
+                index, relative_base, running_program, std_input, std_output
+            )
+
     return running_program
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = collections.defaultdict(int)
-    for index, value in enumerate(content.strip().split(",")):
-        program[index] = int(value)
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def main(
+    loop_idioms=False, trace=False, memoize=False, count_instructions=False
+):
+    filename = HERE / "input.txt"
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
 
     for input_val in (1, 2):
         std_input_list = [input_val]
         std_input = iter(std_input_list)
         std_output = []
-        run_intcode(program, std_input, std_output)
+        counters = collections.Counter()
+        run_intcode(
+            program,
+            std_input,
+            std_output,
+            loop_idioms=loop_idioms,
+            trace=trace,
+            memoize=memoize,
+            counters=counters,
+        )
         print(std_output)
+        if count_instructions:
+            print(
+                f"  {counters['instructions']} instructions dispatched, "
+                f"{counters['collapsed']} replaced by collapsed loops, "
+                f"{counters['traced']} run in compiled traces, "
+                f"{counters['memoized']} skipped by cached calls"
+            )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--loop-idioms",
+        action="store_true",
+        help="Run hot counted loops in closed form",
+    )
+    parser.add_argument(
+        "--trace", action="store_true", help="Compile traces of hot loops"
+    )
+    parser.add_argument(
+        "--memoize", action="store_true", help="Cache pure subroutine calls"
+    )
+    parser.add_argument("--count-instructions", action="store_true")
+    args = parser.parse_args()
+    main(
+        loop_idioms=args.loop_idioms,
+        trace=args.trace,
+        memoize=args.memoize,
+        count_instructions=args.count_instructions,
+    )
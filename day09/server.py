@@ -0,0 +1,253 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Long-lived local Intcode job server.
+
+Keeps parsed programs warm in a pool of worker processes and accepts jobs
+as newline-delimited JSON over a Unix domain socket. Each request is
+either a single job, a batch (``{"jobs": [...]}``, dispatched to the pool
+together) or ``{"command": "stats"}``. A job that runs more than
+``--max-steps`` instructions is stopped and answered with
+``{"error": "timeout"}``, so it can't hold on to a worker forever.
+"""
+
+import argparse
+import collections
+import json
+import multiprocessing
+import os
+import re
+import signal
+import socketserver
+import threading
+import time
+
+import client
+import main as day09
+
+
+ROOT = day09.HERE.parent
+PROGRAM_ID_PATTERN = re.compile(r"day\d\d")
+# Per-worker cache of parsed programs.
+PROGRAMS = {}
+JOB_KEY_TYPES = {"program": str, "inputs": list, "patches": dict}
+REQUIRED_JOB_KEYS = ("program", "inputs")
+DEFAULT_MAX_STEPS = 10000000
+
+
+def get_program(program_id):
+    program = PROGRAMS.get(program_id)
+    if program is None:
+        if PROGRAM_ID_PATTERN.fullmatch(program_id) is None:
+            raise ValueError("Invalid program ID", program_id)
+        values = day09.load_program(ROOT / program_id / "input.txt")
+        program = collections.defaultdict(int, enumerate(values.tolist()))
+        PROGRAMS[program_id] = program
+
+    return program
+
+
+def warm_up(program_ids):
+    for program_id in program_ids:
+        get_program(program_id)
+
+
+def validate_job(job):
+    """Check the shape of a job; returns an error message or ``None``."""
+    if not isinstance(job, dict):
+        return "Job must be an object"
+    for key in REQUIRED_JOB_KEYS:
+        if key not in job:
+            return f"Job is missing {key!r}"
+    for key, expected_type in JOB_KEY_TYPES.items():
+        if key in job and not isinstance(job[key], expected_type):
+            return f"Job {key!r} must be a {expected_type.__name__}"
+
+    return None
+
+
+class StepLimitExceeded(Exception):
+    pass
+
+
+class StepBudget(collections.Counter):
+    """Counters for :func:`day09.run_intcode` that also enforce a budget.
+
+    The run is stopped (by raising :exc:`StepLimitExceeded` from the VM's
+    own instruction counter) once more than ``max_steps`` instructions
+    have been dispatched.
+    """
+
+    def __init__(self, max_steps):
+        super().__init__()
+        self.max_steps = max_steps
+
+    def __setitem__(self, key, value):
+        if key == "instructions" and value > self.max_steps:
+            raise StepLimitExceeded(self.max_steps)
+        super().__setitem__(key, value)
+
+
+def run_job(job):
+    started = time.time()
+    start = time.perf_counter()
+    std_output = []
+    try:
+        program = get_program(job["program"])
+        patches = job.get("patches")
+        if patches:
+            program = program.copy()
+            for index, value in patches.items():
+                program[int(index)] = value
+        budget = StepBudget(job["max_steps"])
+        day09.run_intcode(
+            program, iter(job["inputs"]), std_output, counters=budget
+        )
+        result = {"outputs": std_output}
+    except StepLimitExceeded:
+        result = {"error": "timeout"}
+    except Exception as exc:
+        result = {"error": repr(exc)}
+
+    result["metrics"] = {
+        "queue_seconds": started - job["submitted"],
+        "run_seconds": time.perf_counter() - start,
+        "num_inputs": len(job["inputs"]),
+        "num_outputs": len(std_output),
+        "worker": os.getpid(),
+    }
+    return result
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as exc:
+                response = {"error": f"Invalid JSON: {exc}"}
+            else:
+                response = self.server.dispatch(request)
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class JobServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, pool, max_steps=DEFAULT_MAX_STEPS):
+        super().__init__(str(socket_path), JobHandler)
+        self.pool = pool
+        self.max_steps = max_steps
+        self.lock = threading.Lock()
+        self.stats = collections.Counter()
+        self.started = time.time()
+
+    def dispatch(self, request):
+        if not isinstance(request, dict):
+            return {"error": "Request must be an object"}
+
+        if request.get("command") == "stats":
+            with self.lock:
+                stats = dict(self.stats)
+            stats["uptime_seconds"] = time.time() - self.started
+            return stats
+
+        if "jobs" in request:
+            jobs = request["jobs"]
+            if not isinstance(jobs, list):
+                return {"error": "'jobs' must be a list"}
+        else:
+            jobs = [request]
+
+        # NOTE: Malformed jobs are answered here, so they never reach (and
+        #       can't fail) the rest of the batch in the pool.
+        results = [None] * len(jobs)
+        valid_indices = []
+        for index, job in enumerate(jobs):
+            error = validate_job(job)
+            if error is None:
+                valid_indices.append(index)
+            else:
+                results[index] = {"error": error}
+
+        submitted = time.time()
+        valid_jobs = [jobs[index] for index in valid_indices]
+        for job in valid_jobs:
+            job["submitted"] = submitted
+            job["max_steps"] = self.max_steps
+        for index, result in zip(
+            valid_indices, self.pool.map(run_job, valid_jobs)
+        ):
+            results[index] = result
+
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["jobs"] += len(results)
+            for result in results:
+                if "error" in result:
+                    self.stats["errors"] += 1
+                if result.get("error") == "timeout":
+                    self.stats["timeouts"] += 1
+                metrics = result.get("metrics")
+                if metrics is not None:
+                    self.stats["run_seconds"] += metrics["run_seconds"]
+                    self.stats["queue_seconds"] += metrics["queue_seconds"]
+
+        if "jobs" in request:
+            return results
+        return results[0]
+
+
+def stop_serving(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=client.DEFAULT_SOCKET)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--preload",
+        nargs="*",
+        default=["day05", "day07", "day09", "day11", "day13"],
+        help="Program IDs to parse when each worker starts",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=DEFAULT_MAX_STEPS,
+        help="Instructions a job may run before it is stopped",
+    )
+    args = parser.parse_args()
+
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    with multiprocessing.Pool(
+        processes=args.workers, initializer=warm_up, initargs=(args.preload,)
+    ) as pool:
+        # NOTE: Installed after the pool has started, so only the server
+        #       process handles SIGTERM this way.
+        signal.signal(signal.SIGTERM, stop_serving)
+        with JobServer(args.socket, pool, args.max_steps) as server:
+            print(f"Listening on {args.socket}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os.unlink(args.socket)
+
+
+if __name__ == "__main__":
+    main()
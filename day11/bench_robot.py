@@ -0,0 +1,105 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import tempfile
+import time
+
+import main as day11
+
+
+DIRECT_STEPS = 500000
+PROGRAM_STEPS = 20000
+COUNTER_ADDRESS = 102
+
+
+def langtons_ant_program(num_steps):
+    # Langton's ant: flip the color of the current panel, turn left on
+    # black (0) and right on white (1). Runs for `num_steps` moves.
+    instructions = [
+        (3, 100),  # [100] <- current color
+        (1002, 100, -1, 101),  # [101] <- -[100]
+        (1001, 101, 1, 101),  # [101] <- [101] + 1
+        (4, 101),  # Paint 1 - color
+        (4, 100),  # Turn left (black) or right (white)
+        (1001, COUNTER_ADDRESS, -1, COUNTER_ADDRESS),  # Decrement counter
+        (1005, COUNTER_ADDRESS, 0),  # Loop while counter is non-zero
+        (99,),
+    ]
+    source = [value for instruction in instructions for value in instruction]
+    program = collections.defaultdict(int)
+    for index, value in enumerate(source):
+        program[index] = value
+    program[COUNTER_ADDRESS] = num_steps
+    return program
+
+
+def drive_directly(robot, num_steps):
+    # Same ant as `langtons_ant_program()`, without the Intcode overhead.
+    for _ in range(num_steps):
+        color = next(robot)
+        robot.append(1 - color)
+        robot.append(color)
+
+
+def painted_panels(robot):
+    return sorted(robot.painted_panels())
+
+
+def time_it(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def compare(label, run_fn):
+    robot, slow_time = time_it(run_fn, day11.Robot)
+    fast_robot, fast_time = time_it(run_fn, day11.FastRobot)
+    expected = painted_panels(robot)
+    assert painted_panels(fast_robot) == expected
+
+    print(label)
+    print(f"  Robot:              {slow_time:.4f}s")
+    print(f"  FastRobot:          {fast_time:.4f}s")
+    print(f"  Speedup:            {slow_time / fast_time:.1f}x")
+
+    grid_robot, grid_time = time_it(run_fn, day11.FastRobot, day11.PanelGrid())
+    assert painted_panels(grid_robot) == expected
+    print(f"  FastRobot (chunks): {grid_time:.4f}s")
+
+    with tempfile.NamedTemporaryFile() as file_obj:
+        panels = day11.PanelGrid(backing_file=file_obj.name)
+        mmap_robot, mmap_time = time_it(run_fn, day11.FastRobot, panels)
+        assert painted_panels(mmap_robot) == expected
+    print(f"  FastRobot (mmap):   {mmap_time:.4f}s")
+
+
+def run_direct(robot_class, panels=None):
+    kwargs = {} if panels is None else {"panels": panels}
+    robot = robot_class(day11.COLOR_BLACK, **kwargs)
+    drive_directly(robot, DIRECT_STEPS)
+    return robot
+
+
+def run_program(robot_class, panels=None):
+    kwargs = {} if panels is None else {"panels": panels}
+    program = langtons_ant_program(PROGRAM_STEPS)
+    return day11.paint_hull(program, day11.COLOR_BLACK, robot_class, **kwargs)
+
+
+def main():
+    compare(f"Robot only ({DIRECT_STEPS} steps)", run_direct)
+    compare(f"Intcode + robot ({PROGRAM_STEPS} steps)", run_program)
+
+
+if __name__ == "__main__":
+    main()
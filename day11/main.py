@@ -10,8 +10,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
 import collections
 import copy
+import doctest
 import operator
 import pathlib
 import uuid
@@ -44,6 +46,22 @@ COLOR_WHITE = 1
 MAX_PIXEL = 255
 TURN_LEFT = np.array([[0, -1], [1, 0]])
 TURN_RIGHT = np.array([[0, 1], [-1, 0]])
+# Headings are numbered counter-clockwise, starting from "up", so that
+# turning left adds 1 and turning right adds 3 (modulo 4).
+HEADING_UP = 0
+TURN_TABLES = (
+    (1, 2, 3, 0),  # 0: Turn left
+    (3, 0, 1, 2),  # 1: Turn right
+)
+# Positions are packed as ``(x + offset) << 32 | (y + offset)``, so moving
+# is a single integer addition.
+PACK_OFFSET = 1 << 31
+PACKED_ORIGIN = (PACK_OFFSET << 32) | PACK_OFFSET
+HEADING_DELTAS = (1, -(1 << 32), -1, 1 << 32)  # up, left, down, right
+LOW_32_BITS = 0xFFFFFFFF
+CHUNK_BITS = 6  # 64 x 64 panels per chunk
+INITIAL_CHUNKS = 16
+UNPAINTED = 0  # Chunk cells store ``color + 1`` for painted panels
 
 
 class AdjustBase:
@@ -282,11 +300,42 @@ def run_intcode(program, std_input, std_output):
     return running_program
 
 
+class InputChannel:
+    """FIFO of input values, backed by a ``collections.deque``.
+
+    Values are dropped once they are consumed (via ``next()``), apart from
+    the last ``history`` values, which are kept around for debugging.
+    """
+
+    def __init__(self, values=(), history=0):
+        self.pending = collections.deque(values)
+        self.history = collections.deque(maxlen=history)
+        self.num_consumed = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+
+        value = self.pending.popleft()
+        self.num_consumed += 1
+        if self.history.maxlen:
+            self.history.append(value)
+        return value
+
+    def __len__(self):
+        return len(self.pending)
+
+    def append(self, value):
+        self.pending.append(value)
+
+
 class Robot:
     def __init__(self, start_color):
         assert start_color in (COLOR_BLACK, COLOR_WHITE)
-        self.input_index = 0
-        self.std_input = [start_color]  # Seed first panel
+        self.std_input = InputChannel([start_color])  # Seed first panel
         self.std_output = []
         self.panels = collections.defaultdict(list)
         self.position = np.array([[0], [0]])
@@ -297,9 +346,7 @@ class Robot:
 
     def __next__(self):
         # NOTE: This is not thread-safe
-        curr_index = self.input_index
-        self.input_index = curr_index + 1
-        return self.std_input[curr_index]
+        return next(self.std_input)
 
     def append(self, value):
         # NOTE: This is not thread-safe
@@ -327,58 +374,363 @@ class Robot:
             # Add the color to inputs.
             self.std_input.append(curr_color)
 
+    def painted_count(self):
+        return sum(1 for colors in self.panels.values() if colors)
+
+    def painted_panels(self):
+        for (x, y), colors in self.panels.items():
+            if colors:
+                yield x, y, colors[-1]
+
+
+def pack_position(x, y):
+    return ((x + PACK_OFFSET) << 32) | (y + PACK_OFFSET)
+
+
+def unpack_position(packed):
+    x = (packed >> 32) - PACK_OFFSET
+    y = (packed & LOW_32_BITS) - PACK_OFFSET
+    return x, y
+
+
+class PanelGrid:
+    """Sparse grid of panels, stored as fixed-size square NumPy chunks.
+
+    Implements the subset of the ``dict`` interface used by
+    :class:`FastRobot` (keyed by packed positions). A chunk is only
+    allocated when a panel in it is first painted; reads never allocate.
+    If ``backing_file`` is provided, chunks live in a memory-mapped file
+    rather than in RAM.
+
+    >>> grid = PanelGrid(chunk_bits=2)
+    >>> grid[pack_position(0, 0)] = COLOR_WHITE
+    >>> grid[pack_position(-1, 0)] = COLOR_BLACK
+    >>> grid[pack_position(-1, -5)] = COLOR_WHITE
+    >>> len(grid), len(grid.chunks)
+    (3, 3)
+    >>> grid.get(pack_position(-1, 0))
+    0
+    >>> grid.get(pack_position(0, -1)) is None
+    True
+    >>> grid.get(pack_position(10, 10), COLOR_BLACK)
+    0
+    >>> len(grid.chunks)
+    3
+    >>> xs, ys, colors = grid.arrays()
+    >>> sorted(zip(xs.tolist(), ys.tolist(), colors.tolist()))
+    [(-1, -5, 1), (-1, 0, 0), (0, 0, 1)]
+    """
+
+    def __init__(self, chunk_bits=CHUNK_BITS, backing_file=None):
+        self.chunk_bits = chunk_bits
+        self.chunk_mask = (1 << chunk_bits) - 1
+        self.backing_file = backing_file
+        self.chunks = {}
+        self.num_painted = 0
+        self.capacity = 0
+        self.storage = None
+        self.views = []
+        if backing_file is not None:
+            # Truncate any existing file.
+            with open(backing_file, "wb"):
+                pass
+        self.grow(INITIAL_CHUNKS)
+
+    def grow(self, capacity):
+        chunk_size = 1 << self.chunk_bits
+        shape = (capacity, chunk_size, chunk_size)
+        if self.backing_file is None:
+            storage = np.zeros(shape, dtype=np.uint8)
+            if self.storage is not None:
+                storage[: self.capacity] = self.storage
+        else:
+            if self.storage is not None:
+                self.storage.flush()
+            with open(self.backing_file, "r+b") as file_obj:
+                file_obj.truncate(capacity * chunk_size * chunk_size)
+            storage = np.memmap(
+                self.backing_file, dtype=np.uint8, mode="r+", shape=shape
+            )
+
+        self.storage = storage
+        self.capacity = capacity
+        # NOTE: Flat ``memoryview``-s make single-cell reads and writes much
+        #       cheaper than indexing into NumPy arrays.
+        self.views = [memoryview(chunk.reshape(-1)) for chunk in storage]
+
+    def locate(self, packed):
+        x = packed >> 32
+        y = packed & LOW_32_BITS
+        chunk_bits = self.chunk_bits
+        chunk_mask = self.chunk_mask
+        chunk_key = (x >> chunk_bits, y >> chunk_bits)
+        offset = ((x & chunk_mask) << chunk_bits) | (y & chunk_mask)
+        return chunk_key, offset
+
+    def get(self, packed, default=None):
+        chunk_key, offset = self.locate(packed)
+        slot = self.chunks.get(chunk_key)
+        if slot is None:
+            return default
+
+        value = self.views[slot][offset]
+        if value == UNPAINTED:
+            return default
+        return value - 1
+
+    def __setitem__(self, packed, color):
+        chunk_key, offset = self.locate(packed)
+        slot = self.chunks.get(chunk_key)
+        if slot is None:
+            slot = len(self.chunks)
+            if slot == self.capacity:
+                self.grow(2 * self.capacity)
+            self.chunks[chunk_key] = slot
+
+        view = self.views[slot]
+        if view[offset] == UNPAINTED:
+            self.num_painted += 1
+        view[offset] = color + 1
+
+    def __len__(self):
+        return self.num_painted
+
+    def arrays(self):
+        num_chunks = len(self.chunks)
+        chunk_keys = np.array(list(self.chunks.keys()), dtype=np.int64)
+        slots = np.fromiter(self.chunks.values(), np.int64, count=num_chunks)
+        chunk_x = np.empty(num_chunks, dtype=np.int64)
+        chunk_y = np.empty(num_chunks, dtype=np.int64)
+        chunk_x[slots] = chunk_keys.reshape(-1, 2)[:, 0]
+        chunk_y[slots] = chunk_keys.reshape(-1, 2)[:, 1]
+
+        values = self.storage[:num_chunks]
+        slot_indices, i, j = np.nonzero(values)
+        xs = (chunk_x[slot_indices] << self.chunk_bits) + i - PACK_OFFSET
+        ys = (chunk_y[slot_indices] << self.chunk_bits) + j - PACK_OFFSET
+        colors = values[slot_indices, i, j] - 1
+        return xs, ys, colors
+
+    def items(self):
+        xs, ys, colors = self.arrays()
+        for x, y, color in zip(xs.tolist(), ys.tolist(), colors.tolist()):
+            yield pack_position(x, y), color
+
+
+class FastRobot:
+    """Drop-in replacement for :class:`Robot` for very long paint programs.
+
+    Headings are small integers (turns are table lookups), positions are
+    packed 64-bit integers and each painted panel only stores its current
+    color (a panel is painted if and only if it has an entry in ``panels``).
+    ``panels`` can be a :class:`PanelGrid` to bound memory use.
+    """
+
+    def __init__(self, start_color, panels=None):
+        assert start_color in (COLOR_BLACK, COLOR_WHITE)
+        self.next_color = start_color  # Seed first panel
+        self.on_painted = False
+        self.num_repainted = 0
+        self.paint_color = None
+        if panels is None:
+            panels = {}
+        self.panels = panels
+        self.position = PACKED_ORIGIN
+        self.heading = HEADING_UP
+
+    def __iter__(self):
+        return self
 
-def paint_hull(program, start_color):
-    robot = Robot(start_color)
+    def __next__(self):
+        return self.next_color
+
+    def append(self, value):
+        # NOTE: This is not thread-safe
+        if self.paint_color is None:
+            assert value in (COLOR_BLACK, COLOR_WHITE)
+            self.paint_color = value
+            return
+
+        # Paint the current panel.
+        panels = self.panels
+        if self.on_painted:
+            self.num_repainted += 1
+        panels[self.position] = self.paint_color
+        self.paint_color = None
+        # Turn the robot
+        if value != 0 and value != 1:
+            raise ValueError("Invalid direction", value)
+        heading = TURN_TABLES[value][self.heading]
+        self.heading = heading
+        # Advance the robot
+        position = self.position + HEADING_DELTAS[heading]
+        self.position = position
+        # Get current paint color of new position
+        color = panels.get(position)
+        self.on_painted = color is not None
+        self.next_color = COLOR_BLACK if color is None else color
+
+    def painted_count(self):
+        return len(self.panels)
+
+    def painted_panels(self):
+        for packed, color in self.panels.items():
+            x, y = unpack_position(packed)
+            yield x, y, color
+
+    def panel_arrays(self):
+        if isinstance(self.panels, PanelGrid):
+            return self.panels.arrays()
+
+        num_panels = len(self.panels)
+        packed = np.fromiter(self.panels.keys(), np.uint64, count=num_panels)
+        colors = np.fromiter(self.panels.values(), np.uint8, count=num_panels)
+        xs = (packed >> np.uint64(32)).astype(np.int64) - PACK_OFFSET
+        ys = (packed & np.uint64(LOW_32_BITS)).astype(np.int64) - PACK_OFFSET
+        return xs, ys, colors
+
+    def visited_arrays(self):
+        """Like :meth:`panel_arrays`, but covering every visited panel.
+
+        The robot paints every panel it visits, apart from (possibly) the
+        one it stops on, which is included (as black) if unpainted.
+        """
+        xs, ys, colors = self.panel_arrays()
+        if self.on_painted:
+            return xs, ys, colors
+
+        x, y = unpack_position(self.position)
+        xs = np.append(xs, x)
+        ys = np.append(ys, y)
+        colors = np.append(colors, np.array([COLOR_BLACK], dtype=colors.dtype))
+        return xs, ys, colors
+
+
+def paint_hull(program, start_color, robot_class=FastRobot, **kwargs):
+    robot = robot_class(start_color, **kwargs)
     run_intcode(program, robot, robot)
     return robot
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+def hull_pixels(colors):
+    # Swap white and black and scale up to highest pixel intensity.
+    return MAX_PIXEL - MAX_PIXEL * colors
+
+
+def image_coordinates(xs, ys):
+    # Image rows run from the top of the hull (max ``y``) down and image
+    # columns run from the left of the hull (min ``x``) to the right.
+    rows = ys.max() - ys
+    columns = xs - xs.min()
+    return rows, columns
+
+
+def render_hull(xs, ys, colors):
+    rows, columns = image_coordinates(xs, ys)
+    height = rows.max() + 1
+    width = columns.max() + 1
+    image = np.full((height, width), hull_pixels(COLOR_BLACK), dtype=np.uint8)
+    image[rows, columns] = hull_pixels(colors)
+    return image
+
+
+def save_hull_tiles(xs, ys, colors, tile_size, directory):
+    """Save the hull image as ``tile_size x tile_size`` PNG tiles.
+
+    Only tiles containing at least one painted panel are written, so the
+    full (dense) image is never materialized. The tiles are written into
+    ``directory``, which is created if needed.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    rows, columns = image_coordinates(xs, ys)
+    height = rows.max() + 1
+    width = columns.max() + 1
+    num_tile_columns = -(-width // tile_size)
+    tile_ids = (rows // tile_size) * num_tile_columns + columns // tile_size
+
+    # Group the panels by tile.
+    order = np.argsort(tile_ids, kind="stable")
+    sorted_ids = tile_ids[order]
+    starts = np.flatnonzero(np.diff(sorted_ids, prepend=-1))
+    ends = np.append(starts[1:], sorted_ids.size)
+    for start, end in zip(starts, ends):
+        tile_id = int(sorted_ids[start])
+        tile_row, tile_column = divmod(tile_id, num_tile_columns)
+        row_offset = tile_row * tile_size
+        column_offset = tile_column * tile_size
+        tile_height = min(tile_size, height - row_offset)
+        tile_width = min(tile_size, width - column_offset)
+
+        group = order[start:end]
+        tile = np.full(
+            (tile_height, tile_width), hull_pixels(COLOR_BLACK), dtype=np.uint8
+        )
+        tile_rows = rows[group] - row_offset
+        tile_columns = columns[group] - column_offset
+        tile[tile_rows, tile_columns] = hull_pixels(colors[group])
+        image = PIL.Image.fromarray(tile)
+        image.save(directory / f"image-{tile_row:04}-{tile_column:04}.png")
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = collections.defaultdict(int)
-    for index, value in enumerate(content.strip().split(",")):
-        program[index] = int(value)
+    return np.array(content.strip().split(b",")).astype(np.int64)
 
-    robot = paint_hull(program, COLOR_BLACK)
-    count = sum(1 for colors in robot.panels.values() if colors)
-    print(f"Number of painted panels when starting with Black: {count}")
 
-    robot = paint_hull(program, COLOR_WHITE)
-    all_indices = np.array(list(robot.panels.keys()))
-    min_x = min(all_indices[:, 0])
-    max_x = max(all_indices[:, 0])
-    min_y = min(all_indices[:, 1])
-    max_y = max(all_indices[:, 1])
-    width_x = max_x - min_x + 1
-    width_y = max_y - min_y + 1
-
-    painted = COLOR_BLACK * np.ones((width_x, width_y), dtype=np.uint8)
-    for position, colors in robot.panels.items():
-        if not colors:
-            continue
-        assert len(colors) == 1
-        color = colors[0]
-        assert color in (COLOR_BLACK, COLOR_WHITE)
-        x, y = position
-        shifted_x = x - min_x
-        shifted_y = y - min_y
-        assert 0 <= shifted_x < width_x
-        assert 0 <= shifted_y < width_y
-        painted[shifted_x, shifted_y] = color
-
-    # Swap rows and columns
-    painted = painted.T
-    # Invert rows
-    painted = painted[::-1, :]
+def main(tile_size=None, tile_directory=None, panel_backing_file=None):
+    filename = HERE / "input.txt"
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
 
-    # Swap white and black and scale up to highest pixel intensity.
-    image = PIL.Image.fromarray(MAX_PIXEL - MAX_PIXEL * painted)
-    image.save(HERE / "image.png")
+    kwargs = {}
+    if panel_backing_file is not None:
+        kwargs["panels"] = PanelGrid(backing_file=panel_backing_file)
+    robot = paint_hull(program, COLOR_BLACK, **kwargs)
+    count = robot.painted_count()
+    print(f"Number of painted panels when starting with Black: {count}")
+
+    if panel_backing_file is not None:
+        kwargs["panels"] = PanelGrid(backing_file=panel_backing_file)
+    robot = paint_hull(program, COLOR_WHITE, **kwargs)
+    assert robot.num_repainted == 0
+    xs, ys, colors = robot.visited_arrays()
+    if tile_size is None:
+        image = PIL.Image.fromarray(render_hull(xs, ys, colors))
+        image.save(HERE / "image.png")
+    else:
+        if tile_directory is None:
+            tile_directory = HERE / "tiles"
+        save_hull_tiles(xs, ys, colors, tile_size, tile_directory)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tile-size",
+        type=int,
+        help="Save the hull image as square tiles of this size",
+    )
+    parser.add_argument(
+        "--tile-directory",
+        type=pathlib.Path,
+        help="Directory to save the tiles in (default: tiles/ next to this)",
+    )
+    parser.add_argument(
+        "--panel-backing-file",
+        type=pathlib.Path,
+        help="Store painted panels in chunks memory-mapped from this file",
+    )
+    args = parser.parse_args()
+    doctest.testmod()
+    main(
+        tile_size=args.tile_size,
+        tile_directory=args.tile_directory,
+        panel_backing_file=args.panel_backing_file,
+    )
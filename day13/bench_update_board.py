@@ -0,0 +1,75 @@
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+import numpy as np
+
+import main as day13
+
+
+WIDTH_X = 512
+WIDTH_Y = 256
+NUM_FRAMES = 200
+TILES_PER_FRAME = 5000
+SEED = 13
+
+
+def synthetic_frames(rng):
+    tile_values = np.array(sorted(day13.TILE_IDS))
+    score = 0
+    frames = []
+    for _ in range(NUM_FRAMES):
+        xs = rng.integers(0, WIDTH_X, size=TILES_PER_FRAME)
+        ys = rng.integers(0, WIDTH_Y, size=TILES_PER_FRAME)
+        tiles = rng.choice(tile_values, size=TILES_PER_FRAME)
+        frame = np.column_stack([xs, ys, tiles]).ravel().tolist()
+        score += int(rng.integers(1, 100))
+        frame.extend([-1, 0, score])
+        frames.append(frame)
+    return frames
+
+
+def run_all(update_fn, frames):
+    board = np.zeros((WIDTH_X, WIDTH_Y), dtype=int)
+    dirty = set()
+    score = None
+    start = time.perf_counter()
+    for frame in frames:
+        score = update_fn(board, frame, dirty)
+    duration = time.perf_counter() - start
+    return board, dirty, score, duration
+
+
+def main():
+    rng = np.random.default_rng(SEED)
+    frames = synthetic_frames(rng)
+    num_triples = NUM_FRAMES * (TILES_PER_FRAME + 1)
+    print(f"{NUM_FRAMES} frames, {num_triples} output triples")
+
+    board1, dirty1, score1, loop_time = run_all(day13.update_board, frames)
+    board2, dirty2, score2, bulk_time = run_all(
+        day13.update_board_bulk, frames
+    )
+    assert np.all(board1 == board2)
+    # NOTE: `update_board()` also marks cells that were changed and then
+    #       changed back within a single frame.
+    assert dirty2 <= dirty1
+    assert score1 == score2
+
+    print(f"update_board:      {loop_time:.4f}s")
+    print(f"update_board_bulk: {bulk_time:.4f}s")
+    print(f"Speedup: {loop_time / bulk_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,12 +10,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
 import collections
 import copy
+import doctest
+import hashlib
 import json
 import operator
+import os
 import pathlib
+import struct
+import sys
+import threading
+import time
 import uuid
+import zlib
 
 import numpy as np
 
@@ -50,10 +59,175 @@ TILE_IDS = {
     TILE_PADDLE: "X",  # "PADDLE"
     TILE_BALL: "o",  # "BALL"
 }
+TILE_ID_VALUES = np.array(sorted(TILE_IDS))
 JOYSTICK_NEUTRAL = 0
 JOYSTICK_LEFT = -1
 JOYSTICK_RIGHT = 1
 NUM_QUARTERS = 2
+MOVE_HISTORY = 16
+MOVES_FILE_END = b"\n]\n"
+CHECKPOINT_INTERVAL = 250
+CHECKPOINT_MAX_BYTES = 32 * 1024 * 1024
+CHECKPOINT_MAGIC = b"ICVM"
+CHECKPOINT_VERSION = 1
+CHECKPOINT_PAGE_SIZE = 64
+# Magic, version, page size, image digest, instruction index, relative base
+CHECKPOINT_HEADER = struct.Struct("<4sHH32sqq")
+PAGE_COUNT = struct.Struct("<I")
+VALUES_HEADER = struct.Struct("<BI")
+VALUES_INT64 = 0
+VALUES_BIGINT = 1
+BIGINT_HEADER = struct.Struct("<H")
+METRICS_INTERVAL = 5.0
+METRIC_SPECS = (
+    ("instructions", "counter", "Instructions executed."),
+    ("inputs", "counter", "Input values consumed."),
+    ("outputs", "counter", "Output values produced."),
+    ("input_wait_seconds", "counter", "Time spent blocked waiting on input."),
+    ("run_seconds", "counter", "Time spent running (including waits)."),
+    ("memory_high_water", "gauge", "Largest memory size, in cells."),
+    ("min_relative_base", "gauge", "Smallest relative base."),
+    ("max_relative_base", "gauge", "Largest relative base."),
+)
+CLEAR_SCREEN = "\x1b[2J"
+CLEAR_LINE = "\x1b[K"
+
+
+class RunMetrics:
+    """Counters for the runs of a single Intcode VM."""
+
+    def __init__(self, name):
+        self.name = name
+        self.instructions = 0
+        self.inputs = 0
+        self.outputs = 0
+        self.input_wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.memory_high_water = 0
+        self.min_relative_base = 0
+        self.max_relative_base = 0
+
+    def observe_memory(self, program):
+        size = len(program)
+        if size > self.memory_high_water:
+            self.memory_high_water = size
+
+    def compute_seconds(self):
+        return self.run_seconds - self.input_wait_seconds
+
+
+class MeteredInput:
+    """Count the inputs consumed (and time spent waiting on them).
+
+    An input channel that does more than wait (e.g. one that also updates
+    and renders a game board) sets ``times_input_wait`` and adds its own
+    waits to ``input_wait_seconds``. If ``program`` is provided, the
+    memory size is observed at every input, i.e. whenever the VM pauses.
+    """
+
+    def __init__(self, std_input, metrics, program=None):
+        self.std_input = std_input
+        self.metrics = metrics
+        self.program = program
+        self.timed = not getattr(std_input, "times_input_wait", False)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.program is not None:
+            self.metrics.observe_memory(self.program)
+        if self.timed:
+            start = time.perf_counter()
+            try:
+                value = next(self.std_input)
+            finally:
+                wait_seconds = time.perf_counter() - start
+                self.metrics.input_wait_seconds += wait_seconds
+        else:
+            value = next(self.std_input)
+        self.metrics.inputs += 1
+        return value
+
+
+class MeteredOutput:
+    def __init__(self, std_output, metrics):
+        self.std_output = std_output
+        self.metrics = metrics
+
+    def append(self, value):
+        self.metrics.outputs += 1
+        self.std_output.append(value)
+
+
+def format_prometheus(all_metrics):
+    lines = []
+    for attribute, metric_type, description in METRIC_SPECS:
+        name = f"intcode_{attribute}"
+        if metric_type == "counter":
+            name += "_total"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for metrics in all_metrics:
+            value = getattr(metrics, attribute)
+            lines.append(f'{name}{{vm="{metrics.name}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Registry of :class:`RunMetrics`, periodically dumped to ``path``.
+
+    The file uses the Prometheus text format, e.g. for the node exporter's
+    textfile collector.
+    """
+
+    def __init__(self, path, interval=METRICS_INTERVAL):
+        self.path = pathlib.Path(path)
+        self.interval = interval
+        self.registry = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def metrics(self, name):
+        with self.lock:
+            metrics = self.registry.get(name)
+            if metrics is None:
+                metrics = RunMetrics(name)
+                self.registry[name] = metrics
+            return metrics
+
+    def start(self):
+        self.thread = threading.Thread(target=self.export_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.write()
+
+    def export_loop(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self):
+        with self.lock:
+            all_metrics = list(self.registry.values())
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as file_obj:
+            file_obj.write(format_prometheus(all_metrics))
+        os.replace(tmp_path, self.path)
+
+    def summary(self):
+        lines = []
+        for metrics in self.registry.values():
+            lines.append(
+                f"{metrics.name}: {metrics.instructions} instructions, "
+                f"{metrics.compute_seconds():.3f}s compute, "
+                f"{metrics.input_wait_seconds:.3f}s blocked on input"
+            )
+        return "\n".join(lines)
 
 
 class AdjustBase:
@@ -260,51 +434,537 @@ def execute_instruction(
     raise ValueError("Bad instruction", instruction, modes, params, program)
 
 
-def run_intcode(program, std_input, std_output):
-    relative_base = 0
-    running_program = copy.deepcopy(program)
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+
+def run_machine(machine, std_input, std_output, metrics=None):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a snapshot taken while an INPUT instruction is
+    #       blocked on `std_input` will re-execute that INPUT when resumed.
+    program = machine.program
+    if metrics is not None:
+        start = time.perf_counter()
+        std_input = MeteredInput(std_input, metrics)
+        std_output = MeteredOutput(std_output, metrics)
 
     jump_index = NO_JUMP_JUMP_INDEX
-    index = 0
     while jump_index != TERMINAL_JUMP_INDEX:
-        instruction, modes, params, index = next_instruction(
-            index, running_program
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
         )
         jump_index = execute_instruction(
             instruction,
             modes,
             params,
-            relative_base,
-            running_program,
+            machine.relative_base,
+            program,
             std_input,
             std_output,
         )
         if isinstance(jump_index, AdjustBase):
-            relative_base += jump_index.value
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+            if metrics is not None:
+                metrics.min_relative_base = min(
+                    metrics.min_relative_base, machine.relative_base
+                )
+                metrics.max_relative_base = max(
+                    metrics.max_relative_base, machine.relative_base
+                )
         elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
-            # Nothing to do here, all good.
-            pass
+            machine.index = next_index
         elif jump_index >= 0:
-            index = jump_index
+            machine.index = jump_index
         else:
             raise ValueError("Invalid jump index", jump_index)
 
-    return running_program
+        if metrics is not None:
+            metrics.instructions += 1
+            metrics.observe_memory(program)
+
+    if metrics is not None:
+        metrics.run_seconds += time.perf_counter() - start
+
+    return program
+
+
+def run_intcode(program, std_input, std_output, metrics=None):
+    machine = Machine(copy.deepcopy(program))
+    return run_machine(machine, std_input, std_output, metrics=metrics)
+
+
+def _pack_values(values):
+    """Pack integers as ``int64`` or, if one doesn't fit, as big integers."""
+    values = list(values)
+    try:
+        packed = np.array(values, dtype="<i8").tobytes()
+    except OverflowError:
+        parts = [VALUES_HEADER.pack(VALUES_BIGINT, len(values))]
+        for value in values:
+            size = (value.bit_length() + 8) // 8
+            parts.append(BIGINT_HEADER.pack(size))
+            parts.append(value.to_bytes(size, "little", signed=True))
+        return b"".join(parts)
+
+    return VALUES_HEADER.pack(VALUES_INT64, len(values)) + packed
 
 
-def print_board(board):
+def _unpack_values(data, offset):
+    """Unpack values packed by :func:`_pack_values`.
+
+    Returns the values (as a list) and the offset just after them.
+    """
+    kind, count = VALUES_HEADER.unpack_from(data, offset)
+    offset += VALUES_HEADER.size
+    if kind == VALUES_INT64:
+        end = offset + 8 * count
+        values = np.frombuffer(data[offset:end], dtype="<i8").tolist()
+        return values, end
+
+    if kind != VALUES_BIGINT:
+        raise ValueError("Invalid value encoding", kind)
+
+    values = []
+    for _ in range(count):
+        size, = BIGINT_HEADER.unpack_from(data, offset)
+        offset += BIGINT_HEADER.size
+        end = offset + size
+        values.append(int.from_bytes(data[offset:end], "little", signed=True))
+        offset = end
+    return values, offset
+
+
+def image_digest(image):
+    return hashlib.sha256(np.asarray(image, dtype="<i8").tobytes()).digest()
+
+
+def changed_pages(program, image, page_size=CHECKPOINT_PAGE_SIZE):
+    """Find the memory pages that differ from the original program image.
+
+    Returns a dictionary of page number to the values in that page.
+    """
+    try:
+        addresses = np.fromiter(program.keys(), dtype=np.int64)
+        values = np.fromiter(program.values(), dtype=np.int64)
+    except OverflowError:
+        pages = set(
+            address // page_size
+            for address, value in program.items()
+            if address >= len(image) or value != image[address]
+        )
+    else:
+        in_image = addresses < len(image)
+        original = np.zeros_like(values)
+        original[in_image] = image[addresses[in_image]]
+        pages = np.unique(addresses[values != original] // page_size).tolist()
+
+    return {
+        page: [
+            program.get(address, 0)
+            for address in range(page * page_size, (page + 1) * page_size)
+        ]
+        for page in sorted(pages)
+    }
+
+
+def encode_checkpoint(machine, image, pending_input=(), pending_output=()):
+    """Encode the state of a machine in the compact checkpoint format.
+
+    The header (see :data:`CHECKPOINT_HEADER`) has the format version, the
+    page size, a digest of the original program ``image``, the instruction
+    index and the relative base. It is followed by a ``zlib`` compressed
+    body with the memory pages that differ from ``image``, the pending
+    input and the pending output.
+    """
+    image = np.asarray(image, dtype=np.int64)
+    pages = changed_pages(machine.program, image)
+    parts = [PAGE_COUNT.pack(len(pages))]
+    for page, values in pages.items():
+        parts.append(PAGE_COUNT.pack(page))
+        parts.append(_pack_values(values))
+    parts.append(_pack_values(pending_input))
+    parts.append(_pack_values(pending_output))
+
+    header = CHECKPOINT_HEADER.pack(
+        CHECKPOINT_MAGIC,
+        CHECKPOINT_VERSION,
+        CHECKPOINT_PAGE_SIZE,
+        image_digest(image),
+        machine.index,
+        machine.relative_base,
+    )
+    return header + zlib.compress(b"".join(parts), 1)
+
+
+def decode_checkpoint(data, image):
+    """Decode a checkpoint created by :func:`encode_checkpoint`.
+
+    Returns the machine, the pending input and the pending output.
+
+    For example, a program that writes one cell past its own end stores
+    just that (second) page, on top of the original image:
+
+    >>> image = [1101, 2, 3, 70, 99]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(image)))
+    >>> program = run_machine(machine, iter(()), [])
+    >>> list(changed_pages(machine.program, np.asarray(image)))
+    [1]
+    >>> data = encode_checkpoint(machine, image, pending_output=[5])
+    >>> restored, pending_input, pending_output = decode_checkpoint(
+    ...     data, image
+    ... )
+    >>> restored.index, restored.relative_base
+    (5, 0)
+    >>> [restored.program[address] for address in (0, 1, 2, 3, 4, 70)]
+    [1101, 2, 3, 70, 99, 5]
+    >>> pending_input, pending_output
+    ([], [5])
+    >>> decode_checkpoint(data, [1101, 2, 3, 70, 0])
+    Traceback (most recent call last):
+      ...
+    ValueError: Checkpoint is for a different program image
+    """
+    magic, version, page_size, digest, index, relative_base = (
+        CHECKPOINT_HEADER.unpack_from(data)
+    )
+    if magic != CHECKPOINT_MAGIC:
+        raise ValueError("Not an Intcode checkpoint")
+    if version != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version", version)
+    if digest != image_digest(image):
+        raise ValueError("Checkpoint is for a different program image")
+
+    body = zlib.decompress(data[CHECKPOINT_HEADER.size :])
+    program = collections.defaultdict(
+        int, enumerate(np.asarray(image).tolist())
+    )
+    num_pages, = PAGE_COUNT.unpack_from(body)
+    offset = PAGE_COUNT.size
+    for _ in range(num_pages):
+        page, = PAGE_COUNT.unpack_from(body, offset)
+        values, offset = _unpack_values(body, offset + PAGE_COUNT.size)
+        start = page * page_size
+        program.update(zip(range(start, start + page_size), values))
+    pending_input, offset = _unpack_values(body, offset)
+    pending_output, offset = _unpack_values(body, offset)
+
+    machine = Machine(program, index=index, relative_base=relative_base)
+    return machine, pending_input, pending_output
+
+
+def save_checkpoint(path, machine, image, pending_input=(), pending_output=()):
+    """Write a checkpoint file (atomically, via a temporary file).
+
+    For example, a machine paused on its second INPUT (with one more
+    input value queued and one output not yet consumed) can be resumed
+    from the file, e.g. in a new process:
+
+    >>> import tempfile
+    >>> image = [3, 20, 4, 20, 3, 21, 4, 21, 99]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(image)))
+    >>> std_output = []
+    >>> run_machine(machine, iter([7]), std_output)
+    Traceback (most recent call last):
+      ...
+    StopIteration
+    >>> directory = pathlib.Path(tempfile.mkdtemp())
+    >>> path = directory / "paused.ckpt"
+    >>> save_checkpoint(path, machine, image, [8], std_output)
+    >>> restored, pending_input, pending_output = load_checkpoint(path, image)
+    >>> restored.index, pending_input, pending_output
+    (4, [8], [7])
+    >>> program = run_machine(restored, iter(pending_input), pending_output)
+    >>> pending_output
+    [7, 8]
+    >>> path.unlink()
+    >>> directory.rmdir()
+    """
+    data = encode_checkpoint(machine, image, pending_input, pending_output)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as file_obj:
+        file_obj.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, image):
+    """Read a checkpoint file written by :func:`save_checkpoint`."""
+    with open(path, "rb") as file_obj:
+        return decode_checkpoint(file_obj.read(), image)
+
+
+class TileStatistics:
+    """Output sink that tallies tiles as the VM emits them.
+
+    Only running counts (per tile ID) and the bounding box of the tiles are
+    kept, so memory use does not depend on the size of the screen.
+    """
+
+    def __init__(self):
+        self.pending = []
+        self.counts = collections.Counter()
+        self.score = None
+        self.min_x = None
+        self.max_x = None
+        self.min_y = None
+        self.max_y = None
+
+    def append(self, value):
+        pending = self.pending
+        pending.append(value)
+        if len(pending) < 3:
+            return
+
+        x, y, tile = pending
+        pending.clear()
+        if (x, y) == (-1, 0):
+            self.score = tile
+            return
+
+        self.counts[tile] += 1
+        if self.min_x is None:
+            self.min_x = self.max_x = x
+            self.min_y = self.max_y = y
+            return
+
+        if x < self.min_x:
+            self.min_x = x
+        elif x > self.max_x:
+            self.max_x = x
+        if y < self.min_y:
+            self.min_y = y
+        elif y > self.max_y:
+            self.max_y = y
+
+
+def format_board(board):
+    rows = []
     for row in board.T:
-        for tile in row:
-            print(TILE_IDS[tile], end=" ")
-        print("\n", end="")
+        rows.append("".join(TILE_IDS[tile] + " " for tile in row))
+    return "\n".join(rows)
+
+
+def move_cursor(row, column):
+    # NOTE: Terminal rows and columns are 1-based.
+    return f"\x1b[{row + 1};{column + 1}H"
+
+
+class TerminalRenderer:
+    def __init__(self, stream=None, max_fps=None):
+        if stream is None:
+            stream = sys.stdout
+        self.stream = stream
+        self.frame_time = None if max_fps is None else 1.0 / max_fps
+        self.last_frame = None
+        self.height = None
+
+    def render(self, board, dirty, score):
+        parts = []
+        if self.height is None:
+            # First frame: draw every tile.
+            self.height = board.shape[1]
+            parts.append(CLEAR_SCREEN)
+            parts.append(move_cursor(0, 0))
+            parts.append(format_board(board))
+        else:
+            # Later frames: only redraw the tiles that changed. Each tile
+            # is drawn in a 2-character cell (see `format_board()`).
+            for x, y in dirty:
+                parts.append(move_cursor(y, 2 * x))
+                parts.append(TILE_IDS[board[x, y]])
+        dirty.clear()
+
+        # Status line, then park the cursor (e.g. for an input prompt).
+        parts.append(move_cursor(self.height, 0))
+        parts.append(CLEAR_LINE)
+        parts.append(f"Score: {score or 0}")
+        parts.append(move_cursor(self.height + 1, 0))
+        parts.append(CLEAR_LINE)
+
+        self.wait_for_frame()
+        self.stream.write("".join(parts))
+        self.stream.flush()
+
+    def wait_for_frame(self):
+        if self.frame_time is None:
+            return
+
+        now = time.monotonic()
+        if self.last_frame is not None:
+            remaining = self.last_frame + self.frame_time - now
+            if remaining > 0:
+                time.sleep(remaining)
+                now += remaining
+        self.last_frame = now
+
+
+class SnapshotCache:
+    """On-disk cache of Arcade snapshots with LRU eviction.
+
+    Each entry is a checkpoint file (see :func:`save_checkpoint`). Entries
+    are evicted (least recently used first, as tracked by file
+    modification time) once the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory, max_bytes=CHECKPOINT_MAX_BYTES):
+        self.directory = pathlib.Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / f"{key}.ckpt"
+
+    def __contains__(self, key):
+        return self.path(key).exists()
+
+    def get(self, key, image):
+        """Load a checkpoint; returns ``None`` if there is none for ``key``.
+
+        Otherwise, returns the machine, the pending input and the pending
+        output (as :func:`load_checkpoint` does).
+        """
+        path = self.path(key)
+        try:
+            checkpoint = load_checkpoint(path, image)
+        except FileNotFoundError:
+            return None
+
+        # Mark as recently used.
+        os.utime(path)
+        return checkpoint
+
+    def put(self, key, machine, image, pending_input=(), pending_output=()):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        save_checkpoint(
+            self.path(key), machine, image, pending_input, pending_output
+        )
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_bytes = 0
+        for path in self.directory.glob("*.ckpt"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            path.unlink()
+            total_bytes -= size
+
+
+def program_hash(program):
+    hasher = hashlib.sha256()
+    for index in range(len(program)):
+        hasher.update(f"{program[index]},".encode("ascii"))
+    return hasher.hexdigest()
+
+
+def move_hasher(program_key, moves=()):
+    """Rolling hash of the program and a move prefix.
+
+    The digest after ``k`` moves is the cache key of the checkpoint at move
+    index ``k`` (see :func:`checkpoint_keys`).
+    """
+    hasher = hashlib.sha256(program_key.encode("ascii"))
+    for move in moves:
+        hasher.update(f"{move},".encode("ascii"))
+    return hasher
+
+
+def checkpoint_keys(program_key, moves, interval=CHECKPOINT_INTERVAL):
+    """Map each checkpoint move index to a cache key.
+
+    The key for move index ``k`` depends on the program and on the move
+    prefix ``moves[:k]``, so it is invalidated by any change to either.
+    """
+    keys = {}
+    hasher = move_hasher(program_key)
+    for index, move in enumerate(moves):
+        if index > 0 and index % interval == 0:
+            keys[index] = hasher.copy().hexdigest()
+        hasher.update(f"{move},".encode("ascii"))
+
+    num_moves = len(moves)
+    if num_moves > 0 and num_moves % interval == 0:
+        keys[num_moves] = hasher.hexdigest()
+    return keys
+
+
+def append_move(path, move, num_moves):
+    """Append ``move`` to the ``num_moves`` moves saved in ``path``.
+
+    Only the closing bracket is rewritten, so the file keeps the format of
+    ``json.dump(moves, file_obj, indent=4)`` without being rewritten.
+    """
+    if num_moves == 0:
+        with open(path, "w") as file_obj:
+            json.dump([move], file_obj, indent=4)
+            file_obj.write("\n")
+        return
+
+    with open(path, "r+b") as file_obj:
+        file_obj.seek(-len(MOVES_FILE_END), os.SEEK_END)
+        if file_obj.read() != MOVES_FILE_END:
+            raise ValueError("Unexpected end of moves file", path)
+        file_obj.seek(-len(MOVES_FILE_END), os.SEEK_END)
+        file_obj.write(f",\n    {move}".encode("ascii") + MOVES_FILE_END)
+
+
+class InputChannel:
+    """FIFO of input values, backed by a ``collections.deque``.
+
+    Values are dropped once they are consumed (via ``next()``), apart from
+    the last ``history`` values, which are kept around for debugging.
+    """
+
+    def __init__(self, values=(), history=0):
+        self.pending = collections.deque(values)
+        self.history = collections.deque(maxlen=history)
+        self.num_consumed = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+
+        value = self.pending.popleft()
+        self.num_consumed += 1
+        if self.history.maxlen:
+            self.history.append(value)
+        return value
+
+    def __len__(self):
+        return len(self.pending)
+
+    def append(self, value):
+        self.pending.append(value)
 
 
 class Arcade:
-    def __init__(self, seed_moves, program):
+    # NOTE: Only waiting on the player counts as blocked on input (see
+    #       ``MeteredInput``), not updating or rendering the board.
+    times_input_wait = True
+
+    def __init__(
+        self, seed_moves, program, renderer=None, watch=False, cache=None
+    ):
         self.program = copy.deepcopy(program)
         self.program[0] = NUM_QUARTERS
+        self.machine = Machine(copy.deepcopy(self.program))
         self.index = 0
-        self.std_input = [value for value in seed_moves]
+        # NOTE: New moves are only appended to ``moves.json`` (so they are
+        #       not kept in memory); ``std_input`` is the only owner of the
+        #       seed moves, and only holds those not consumed yet.
+        self.std_input = InputChannel(seed_moves, history=MOVE_HISTORY)
+        self.num_moves = len(self.std_input)
         self.std_output = []
         self.score = None
         self.board = None
@@ -312,6 +972,23 @@ class Arcade:
         self.paddle_location = None
         self.trajectory = None
         self.retired_output = []
+        if renderer is None:
+            renderer = TerminalRenderer()
+        self.renderer = renderer
+        self.watch = watch
+        self.dirty = set()
+        self.cache = cache
+        self.metrics = None
+        self.image = np.array(
+            [self.program[index] for index in range(len(self.program))]
+        )
+        # NOTE: Snapshots from an older checkpoint format get new keys.
+        self.program_key = (
+            f"{program_hash(self.program)}-v{CHECKPOINT_VERSION}"
+        )
+        # NOTE: The hash of every move consumed so far, i.e. the key of a
+        #       checkpoint taken now.
+        self.move_hasher = move_hasher(self.program_key)
 
     def __iter__(self):
         return self
@@ -321,52 +998,50 @@ class Arcade:
         self.index = curr_index + 1
         if self.board is None:
             assert curr_index == 0
-            num_tiles, remainder = divmod(len(self.std_output), 3)
-            assert remainder == 0
+            self.board, scores = frame_to_board(self.std_output)
             # Set the score.
-            assert self.std_output[-3:] == [-1, 0, 0]
+            assert scores.tolist() == [0]
             self.score = 0
-            # Determine the board size.
-            x_values = self.std_output[:-3:3]
-            assert min(x_values) == 0
-            width_x = max(x_values) + 1
-            y_values = self.std_output[1:-3:3]
-            assert min(y_values) == 0
-            width_y = max(y_values) + 1
-            # Populate the board.
-            self.board = TILE_DEFAULT * np.ones((width_x, width_y), dtype=int)
-            for i in range(num_tiles - 1):  # Ignore last triple (-1, 0, 1)
-                x, y, tile = self.std_output[3 * i : 3 * i + 3]
-                assert 0 <= x < width_x
-                assert 0 <= y < width_y
-                assert tile in TILE_IDS
-                if self.board[x, y] != TILE_DEFAULT:
-                    raise ValueError(x, y, self.board)
-                self.board[x, y] = tile
-            # Make sure the board is fully set.
-            assert np.all(self.board != TILE_DEFAULT)
             # Set the location of the ball and paddle (and assert exactly one)
             self.ball_location = locate(self.board, TILE_BALL)
             self.paddle_location = locate(self.board, TILE_PADDLE)
             # Reset std_output
             self.reset_std_output()
+            self.maybe_checkpoint(curr_index)
             # Get the next move
-            next_move(self.board, curr_index, self.std_input)
+            self.maybe_render()
+            self.record_move(self.wait_for_move())
         else:
-            new_score = update_board(self.board, self.std_output)
+            new_score = update_board_bulk(
+                self.board, self.std_output, self.dirty
+            )
             if new_score is not None:
                 self.score = new_score
-                # Only print the new score if we are in "USER INPUT" mode.
-                if curr_index >= len(self.std_input):
-                    print(f"New score: {new_score}")
             self.reset_std_output()
-            updated = next_move(self.board, curr_index, self.std_input)
-            if updated:
-                with open(HERE / "moves.json", "w") as file_obj:
-                    json.dump(self.std_input, file_obj, indent=4)
-                    file_obj.write("\n")
+            self.maybe_checkpoint(curr_index)
+            self.maybe_render()
+            self.record_move(self.wait_for_move())
+
+        move = next(self.std_input)
+        self.move_hasher.update(f"{move},".encode("ascii"))
+        return move
+
+    def wait_for_move(self):
+        if self.metrics is None:
+            return next_move(self.std_input)
+
+        start = time.perf_counter()
+        try:
+            return next_move(self.std_input)
+        finally:
+            self.metrics.input_wait_seconds += time.perf_counter() - start
 
-        return self.std_input[curr_index]
+    def record_move(self, move):
+        if move is None:
+            return
+
+        append_move(HERE / "moves.json", move, self.num_moves)
+        self.num_moves += 1
 
     def append(self, value):
         self.std_output.append(value)
@@ -375,13 +1050,74 @@ class Arcade:
         self.retired_output.append(self.std_output)
         self.std_output = []
 
+    def run(self, metrics=None):
+        self.metrics = metrics
+        return run_machine(self.machine, self, self, metrics=metrics)
+
+    def restore(self, move_index, machine, pending_output):
+        self.machine = machine
+        self.index = move_index
+        # NOTE: This only happens before any move has been consumed, so the
+        #       moves up to the snapshot are consumed (i.e. skipped) here.
+        assert self.std_input.num_consumed == 0
+        replayed = [next(self.std_input) for _ in range(self.index)]
+        self.move_hasher = move_hasher(self.program_key, replayed)
+        # NOTE: The pending output is a full frame (see ``board_frame()``).
+        self.board, scores = frame_to_board(pending_output)
+        self.score, = scores.tolist()
+        self.ball_location = locate(self.board, TILE_BALL)
+        self.paddle_location = locate(self.board, TILE_PADDLE)
+        self.std_output = []
+        self.dirty.clear()
+
+    def maybe_checkpoint(self, curr_index):
+        # NOTE: This is called just before move ``curr_index`` is consumed,
+        #       i.e. the VM is blocked on the INPUT for that move and the
+        #       board reflects every output produced before it.
+        if self.cache is None:
+            return
+        if curr_index == 0 or curr_index % CHECKPOINT_INTERVAL != 0:
+            return
+
+        key = self.move_hasher.hexdigest()
+        if key not in self.cache:
+            frame = board_frame(self.board, self.score)
+            self.cache.put(key, self.machine, self.image, pending_output=frame)
+
+    def fast_forward(self):
+        """Resume from the latest checkpoint matching the seed moves.
+
+        Returns the move index that was resumed from (0 if no checkpoint
+        matched).
+        """
+        if self.cache is None:
+            return 0
+
+        keys = checkpoint_keys(self.program_key, self.std_input.pending)
+        for move_index in sorted(keys, reverse=True):
+            checkpoint = self.cache.get(keys[move_index], self.image)
+            if checkpoint is None:
+                continue
+            machine, pending_input, pending_output = checkpoint
+            assert pending_input == []
+            self.restore(move_index, machine, pending_output)
+            return move_index
+
+        return 0
+
+    def maybe_render(self):
+        # Only render in "USER INPUT" mode (i.e. no more moves to replay),
+        # unless watching the replay.
+        if self.watch or not self.std_input:
+            self.renderer.render(self.board, self.dirty, self.score)
+
 
 def locate(board, tile):
     (x,), (y,) = np.where(board == tile)
     return x, y
 
 
-def update_board(board, std_output):
+def update_board(board, std_output, dirty=None):
     width_x, width_y = board.shape
     size = len(std_output)
     assert size % 3 == 0
@@ -404,62 +1140,220 @@ def update_board(board, std_output):
         assert 0 <= x < width_x, (x, y, tile)
         assert 0 <= y < width_y, (x, y, tile)
         assert tile in TILE_IDS
+        if dirty is not None and board[x, y] != tile:
+            dirty.add((x, y))
         board[x, y] = tile
 
     return new_score
 
 
-def next_move(board, index, std_input):
-    if index < len(std_input):
-        return False
+def decode_frame(std_output):
+    """Split a batch of output triples into tiles and score records.
+
+    Returns the ``x``, ``y`` and tile ID columns for the tiles and the
+    (in order) values of the score records.
+    """
+    triples = np.asarray(std_output, dtype=np.int64).reshape(-1, 3)
+    xs, ys, values = triples.T
+    is_score = (xs == -1) & (ys == 0)
+    is_tile = ~is_score
+    xs = xs[is_tile]
+    ys = ys[is_tile]
+    tiles = values[is_tile]
+    assert np.all(np.isin(tiles, TILE_ID_VALUES)), tiles
+    return xs, ys, tiles, values[is_score]
+
+
+def frame_to_board(std_output):
+    """Build a board from a frame that sets every tile exactly once.
+
+    Returns the board and the (in order) values of the score records.
+
+    >>> frame = [1, 0, 4, 0, 0, 1, -1, 0, 7, 0, 1, 0, 1, 1, 3]
+    >>> board, scores = frame_to_board(frame)
+    >>> board.tolist()
+    [[1, 0], [4, 3]]
+    >>> scores.tolist()
+    [7]
+    """
+    xs, ys, tiles, scores = decode_frame(std_output)
+    # Determine the board size.
+    assert xs.min() == 0
+    width_x = xs.max() + 1
+    assert ys.min() == 0
+    width_y = ys.max() + 1
+    # Populate the board (and make sure no tile is set twice).
+    linear = np.ravel_multi_index((xs, ys), (width_x, width_y))
+    if np.unique(linear).size != linear.size:
+        raise ValueError("Tile set more than once", std_output)
+    board = np.full((width_x, width_y), TILE_DEFAULT, dtype=int)
+    board[xs, ys] = tiles
+    # Make sure the board is fully set.
+    assert np.all(board != TILE_DEFAULT)
+    return board, scores
+
+
+def board_frame(board, score):
+    """Encode a board and score as a frame of output triples.
+
+    This is the inverse of :func:`frame_to_board`.
+
+    >>> board = np.array([[1, 0], [4, 3]])
+    >>> frame = board_frame(board, 7)
+    >>> frame
+    [0, 0, 1, 0, 1, 0, 1, 0, 4, 1, 1, 3, -1, 0, 7]
+    >>> restored, scores = frame_to_board(frame)
+    >>> np.array_equal(restored, board), scores.tolist()
+    (True, [7])
+    """
+    xs, ys = np.indices(board.shape)
+    triples = np.column_stack([xs.ravel(), ys.ravel(), board.ravel()])
+    return triples.ravel().tolist() + [-1, 0, score]
+
+
+def update_board_bulk(board, std_output, dirty=None):
+    """Vectorized equivalent of :func:`update_board`."""
+    xs, ys, tiles, scores = decode_frame(std_output)
+
+    new_score = None
+    if scores.size > 0:
+        assert np.all(np.diff(scores) > 0), scores
+        new_score = int(scores[-1])
+
+    if tiles.size == 0:
+        return new_score
+
+    width_x, width_y = board.shape
+    assert np.all((0 <= xs) & (xs < width_x)), xs
+    assert np.all((0 <= ys) & (ys < width_y)), ys
+    # If a cell is written more than once, only the last write survives.
+    linear = np.ravel_multi_index((xs, ys), (width_x, width_y))
+    _, last_reversed = np.unique(linear[::-1], return_index=True)
+    keep = linear.size - 1 - last_reversed
+    xs = xs[keep]
+    ys = ys[keep]
+    tiles = tiles[keep]
+
+    if dirty is not None:
+        changed = board[xs, ys] != tiles
+        dirty.update(zip(xs[changed].tolist(), ys[changed].tolist()))
+    board[xs, ys] = tiles
+
+    return new_score
+
+
+def next_move(std_input):
+    if std_input:
+        return None
 
-    print_board(board)
     next_move = input("l/-/r? ")
     if next_move == "l":
         std_input.append(JOYSTICK_LEFT)
-        return True
+        return JOYSTICK_LEFT
 
     if next_move == "-":
         std_input.append(JOYSTICK_NEUTRAL)
-        return True
+        return JOYSTICK_NEUTRAL
 
     if next_move == "r":
         std_input.append(JOYSTICK_RIGHT)
-        return True
+        return JOYSTICK_RIGHT
 
     raise ValueError("Invalid input", next_move)
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    program = collections.defaultdict(int)
-    for index, value in enumerate(content.strip().split(",")):
-        program[index] = int(value)
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def main(
+    watch=False,
+    max_fps=None,
+    use_checkpoints=True,
+    metrics_file=None,
+    metrics_interval=METRICS_INTERVAL,
+):
+    filename = HERE / "input.txt"
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
 
     std_input_list = []
     std_input = iter(std_input_list)
-    std_output = []
-    run_intcode(program, std_input, std_output)
-    assert len(std_output) % 3 == 0
-    tile_ids = std_output[2::3]
-    tile_id_counts = collections.Counter(tile_ids)
-    print(f"Number of blocks: {tile_id_counts[TILE_BLOCK]}")
-
+    exporter = None
+    if metrics_file is not None:
+        exporter = MetricsExporter(metrics_file, interval=metrics_interval)
+        exporter.start()
+
+    statistics = TileStatistics()
+    metrics = None if exporter is None else exporter.metrics("blocks")
+    run_intcode(program, std_input, statistics, metrics=metrics)
+    assert not statistics.pending
+    print(f"Number of blocks: {statistics.counts[TILE_BLOCK]}")
+
+    renderer = TerminalRenderer(max_fps=max_fps)
+    cache = None
+    if use_checkpoints and not watch:
+        cache = SnapshotCache(HERE / "snapshots")
+    # NOTE: The seed moves are only referenced by the arcade's input channel.
     with open(HERE / "moves.json", "r") as file_obj:
-        seed_moves = json.load(file_obj)
-    arcade = Arcade(seed_moves, program)
-    run_intcode(arcade.program, arcade, arcade)
+        arcade = Arcade(
+            json.load(file_obj),
+            program,
+            renderer=renderer,
+            watch=watch,
+            cache=cache,
+        )
+    arcade.fast_forward()
+    metrics = None if exporter is None else exporter.metrics("arcade")
+    arcade.run(metrics=metrics)
     assert arcade.std_output
-    new_score = update_board(arcade.board, arcade.std_output)
+    new_score = update_board_bulk(
+        arcade.board, arcade.std_output, arcade.dirty
+    )
     assert new_score is not None
     arcade.score = new_score
     arcade.reset_std_output()
+    if renderer.height is not None:
+        renderer.render(arcade.board, arcade.dirty, arcade.score)
 
     print(f"Final score: {arcade.score}")
 
+    if exporter is not None:
+        exporter.stop()
+        print(exporter.summary())
+
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--watch", action="store_true", help="Render replayed moves"
+    )
+    parser.add_argument("--fps", type=float, help="Maximum frame rate")
+    parser.add_argument(
+        "--no-checkpoints",
+        action="store_true",
+        help="Replay all moves from the start of the program",
+    )
+    parser.add_argument(
+        "--metrics-file", help="Prometheus text file to export metrics to"
+    )
+    parser.add_argument(
+        "--metrics-interval", type=float, default=METRICS_INTERVAL
+    )
+    args = parser.parse_args()
+    doctest.testmod()
+    main(
+        watch=args.watch,
+        max_fps=args.fps,
+        use_checkpoints=not args.no_checkpoints,
+        metrics_file=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+    )
@@ -10,19 +10,461 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import doctest
+import operator
 import pathlib
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+DIRECTIONS = {
+    1: (0, 1),  # North
+    2: (0, -1),  # South
+    3: (-1, 0),  # West
+    4: (1, 0),  # East
+}
+WALL = 0
+OPEN = 1
+OXYGEN = 2
+
+
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class CowMemory:
+    """Copy-on-write Intcode memory.
+
+    Reads fall through the cells written by this machine to a shared,
+    read-only ``base`` image of the program, so a fork only copies the
+    (typically few) cells that have been written.
+    """
+
+    __slots__ = ("base", "written")
+
+    def __init__(self, base, written=None):
+        self.base = base
+        self.written = {} if written is None else written
+
+    def __getitem__(self, key):
+        written = self.written
+        if key in written:
+            return written[key]
+        return self.base.get(key, 0)
+
+    def __setitem__(self, key, value):
+        self.written[key] = value
+
+    def fork(self):
+        return CowMemory(self.base, self.written.copy())
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+    def fork(self):
+        return Machine(self.program.fork(), self.index, self.relative_base)
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+def move(machine, direction):
+    """Send a movement command to the droid and return its status code."""
+    std_output = []
+    try:
+        run_machine(machine, iter([direction]), std_output)
+    except StopIteration:
+        pass
+    else:
+        raise RuntimeError("Droid halted", machine.index)
+
+    status, = std_output
+    return status
+
+
+def explore(program):
+    """Map the maze with a breadth-first search.
+
+    Rather than walking the droid back and forth, the machine is forked at
+    every frontier cell, so each move is made from a snapshot of the droid
+    already standing next to the unexplored cell.
+
+    Returns the tiles found (keyed by position) and the distance from the
+    start to each open tile.
+
+    For example, with a droid in an east-west corridor that runs from
+    ``x = -1`` to the oxygen system at ``x = 3``:
+
+    >>> program = [
+    ...     *(3, 101, 1008, 101, 4, 102, 1008, 101, 3, 103),  # Read direction
+    ...     *(1002, 103, -1, 103, 1, 102, 103, 104),  # dx = East - West
+    ...     *(1006, 104, 56, 1, 100, 104, 105),  # Wall if dx == 0
+    ...     *(1007, 105, -1, 106, 1005, 106, 56),  # Wall if x + dx < -1
+    ...     *(107, 3, 105, 106, 1005, 106, 56),  # Wall if 3 < x + dx
+    ...     *(1001, 105, 0, 100, 1008, 100, 3, 107, 1001, 107, 1, 107),
+    ...     *(4, 107, 1105, 1, 0),  # Moved (status 2 at the oxygen system)
+    ...     *(104, 0, 1105, 1, 0),  # Hit a wall
+    ... ]
+    >>> tiles, distances = explore(dict(enumerate(program)))
+    >>> grid = to_grid(tiles)
+    >>> for row in grid.T[::-1]:
+    ...     print("".join("#.O"[tile] for tile in row))
+    #######
+    #....O#
+    #######
+    >>> distances[3, 0], fill_time(grid)
+    (3, 4)
+    """
+    start = 0, 0
+    tiles = {start: OPEN}
+    distances = {start: 0}
+    queue = collections.deque([(start, Machine(CowMemory(program)))])
+    while queue:
+        position, machine = queue.popleft()
+        x, y = position
+        for direction, (dx, dy) in DIRECTIONS.items():
+            neighbor = x + dx, y + dy
+            if neighbor in tiles:
+                continue
+
+            child = machine.fork()
+            status = move(child, direction)
+            tiles[neighbor] = status
+            if status == WALL:
+                continue
+            distances[neighbor] = distances[position] + 1
+            queue.append((neighbor, child))
+
+    return tiles, distances
+
+
+def to_grid(tiles):
+    """Convert explored tiles to a grid; unexplored cells are walls."""
+    xs, ys = zip(*tiles.keys())
+    min_x = min(xs)
+    min_y = min(ys)
+    grid = np.full(
+        (max(xs) - min_x + 1, max(ys) - min_y + 1), WALL, dtype=np.int8
+    )
+    for (x, y), tile in tiles.items():
+        grid[x - min_x, y - min_y] = tile
+
+    return grid
+
+
+def fill_time(grid):
+    """Minutes for oxygen to spread from every ``OXYGEN`` cell.
+
+    This is a multi-source BFS, where each step grows the entire frontier at
+    once by shifting the filled mask in all four directions.
+
+    For example, oxygen fills this area in 4 minutes:
+
+    >>> area = [" ##   ", "#..## ", "#.#..#", "#.O.# ", " ###  "]
+    >>> codes = {".": OPEN, "O": OXYGEN}
+    >>> grid = np.array([[codes.get(c, WALL) for c in row] for row in area])
+    >>> fill_time(grid)
+    4
+    """
+    open_cells = grid != WALL
+    filled = grid == OXYGEN
+    minutes = 0
+    while True:
+        grown = filled.copy()
+        grown[1:, :] |= filled[:-1, :]
+        grown[:-1, :] |= filled[1:, :]
+        grown[:, 1:] |= filled[:, :-1]
+        grown[:, :-1] |= filled[:, 1:]
+        grown &= open_cells
+        if np.array_equal(grown, filled):
+            return minutes
+
+        filled = grown
+        minutes += 1
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
+        content = file_obj.read()
+
+    return np.array(content.strip().split(b",")).astype(np.int64)
 
 
 def main():
     filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
-        content = file_obj.read()
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = dict(enumerate(load_program(filename).tolist()))
 
-    print(len(content))
+    tiles, distances = explore(program)
+    oxygen, = [
+        position for position, tile in tiles.items() if tile == OXYGEN
+    ]
+    print(distances[oxygen])
+    print(fill_time(to_grid(tiles)))
 
 
 if __name__ == "__main__":
+    doctest.testmod()
     main()
@@ -10,19 +10,599 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import copy
+import doctest
+import functools
+import operator
 import pathlib
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+ASCII_MAX = 127
+SCAFFOLD = ord("#")
+OPEN_SPACE = ord(".")
+ROBOT_DIRECTIONS = {
+    ord("^"): (-1, 0),
+    ord(">"): (0, 1),
+    ord("v"): (1, 0),
+    ord("<"): (0, -1),
+}
+NUM_FUNCTIONS = 3
+FUNCTION_NAMES = "ABC"
+MAX_ROUTINE_LENGTH = 20
+
+
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+class AsciiInput:
+    """Input channel fed with whole strings (or bytes) at a time.
+
+    Text is queued in bulk as code points in a ``collections.deque``; the
+    channel raises ``StopIteration`` when it runs dry (i.e. the VM blocks).
+    """
+
+    def __init__(self, text=""):
+        self.pending = collections.deque()
+        self.feed(text)
+
+    def feed(self, text):
+        if isinstance(text, str):
+            text = text.encode("ascii")
+        self.pending.extend(text)
+
+    def feed_lines(self, lines):
+        self.feed("".join(f"{line}\n" for line in lines))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+
+        return self.pending.popleft()
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class AsciiOutput:
+    """Output sink that decodes ASCII output into lines.
+
+    The VM's output is buffered in a ``bytearray`` and only decoded (in
+    bulk) by :meth:`flush`, e.g. once the VM blocks on input or halts.
+    Values that aren't ASCII (e.g. a large puzzle answer) are kept, in
+    order, in ``values``.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.lines = []
+        self.values = []
+
+    def append(self, value):
+        if 0 <= value <= ASCII_MAX:
+            self.buffer.append(value)
+        else:
+            self.values.append(value)
+
+    def flush(self):
+        """Decode every complete line in the buffer; returns the new lines."""
+        end = self.buffer.rfind(b"\n")
+        if end == -1:
+            return []
+
+        new_lines = self.buffer[:end].decode("ascii").split("\n")
+        del self.buffer[: end + 1]
+        self.lines.extend(new_lines)
+        return new_lines
+
+
+def run_until_blocked(machine, std_input, std_output):
+    """Run a machine until it halts or blocks on input.
+
+    The (ASCII) output is flushed either way. Returns a flag indicating if
+    the machine halted.
+
+    For example, a program that echoes its input blocks once the input
+    runs dry, and resumes (i.e. re-executes the INPUT) when more is fed:
+
+    >>> echo = [3, 100, 4, 100, 1105, 1, 0]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(echo)))
+    >>> std_input = AsciiInput()
+    >>> std_input.feed_lines(["hello"])
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_input.feed_lines(["world"])
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_output.lines
+    ['hello', 'world']
+
+    Output that isn't ASCII is kept separately:
+
+    >>> answer = [104, 79, 104, 75, 104, 10, 104, 1234, 99]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(answer)))
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, AsciiInput(), std_output)
+    True
+    >>> std_output.lines, std_output.values
+    (['OK'], [1234])
+    """
+    try:
+        run_machine(machine, std_input, std_output)
+    except StopIteration:
+        halted = False
+    else:
+        halted = True
+
+    std_output.flush()
+    return halted
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
+        content = file_obj.read()
+
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def to_grid(lines):
+    """Convert the camera output to a 2D array of ASCII codes."""
+    rows = [line.encode("ascii") for line in lines if line]
+    width = len(rows[0])
+    if any(len(row) != width for row in rows):
+        raise ValueError("Camera rows differ in width", rows)
+
+    return np.frombuffer(b"".join(rows), dtype=np.uint8).reshape(-1, width)
+
+
+def find_intersections(grid):
+    """Find the scaffold cells with scaffold on all four sides.
+
+    Returns the rows and columns of the intersections. In the puzzle's
+    example, the sum of the alignment parameters is 76:
+
+    >>> camera = [
+    ...     "..#..........",
+    ...     "..#..........",
+    ...     "#######...###",
+    ...     "#.#...#...#.#",
+    ...     "#############",
+    ...     "..#...#...#..",
+    ...     "..#####...^..",
+    ... ]
+    >>> rows, columns = find_intersections(to_grid(camera))
+    >>> rows.tolist(), columns.tolist()
+    ([2, 4, 4, 4], [2, 2, 6, 10])
+    >>> int(np.sum(rows * columns))
+    76
+    """
+    scaffold = np.isin(grid, [SCAFFOLD, *ROBOT_DIRECTIONS])
+    inner = (
+        scaffold[1:-1, 1:-1]
+        & scaffold[:-2, 1:-1]
+        & scaffold[2:, 1:-1]
+        & scaffold[1:-1, :-2]
+        & scaffold[1:-1, 2:]
+    )
+    rows, columns = np.nonzero(inner)
+    return rows + 1, columns + 1
+
+
+def trace_path(grid):
+    """Walk the scaffold from the robot, turning only at the ends.
+
+    Returns the path as a list of tokens, e.g. ``["R,8", "L,10"]``.
+    """
+    scaffold = np.isin(grid, [SCAFFOLD, *ROBOT_DIRECTIONS])
+    num_rows, num_columns = grid.shape
+
+    def is_scaffold(row, column):
+        return (
+            0 <= row < num_rows
+            and 0 <= column < num_columns
+            and scaffold[row, column]
+        )
+
+    (row,), (column,) = np.nonzero(np.isin(grid, list(ROBOT_DIRECTIONS)))
+    d_row, d_column = ROBOT_DIRECTIONS[grid[row, column]]
+    # NOTE: If the robot already faces along the scaffold, the path starts
+    #       with a move that has no turn.
+    turn = None
+    tokens = []
+    while True:
+        steps = 0
+        while is_scaffold(row + d_row, column + d_column):
+            row += d_row
+            column += d_column
+            steps += 1
+        if turn is not None:
+            tokens.append(f"{turn},{steps}")
+        elif steps > 0:
+            tokens.append(str(steps))
+
+        if is_scaffold(row - d_column, column + d_row):
+            turn = "L"
+            d_row, d_column = -d_column, d_row
+        elif is_scaffold(row + d_column, column - d_row):
+            turn = "R"
+            d_row, d_column = d_column, -d_row
+        else:
+            return tokens
+
+
+def compress(tokens):
+    """Split the path into a main routine calling (at most) three functions.
+
+    This is a depth first search over the path tokens, where each function
+    is defined at the first position not covered by the ones before it.
+    Branches are pruned as soon as a function or the main routine gets too
+    long, and dead ends are memoized (keyed by the position in the path and
+    the functions defined so far).
+
+    Returns the main routine (as function indices) and the functions, or
+    :data:`None` if the path can't be compressed.
+
+    >>> path = "R,8,R,8,R,4,R,4,R,8,L,6,L,2,R,4,R,4,R,8,R,8,R,8,L,6,L,2"
+    >>> moves = path.split(",")
+    >>> tokens = [",".join(moves[i : i + 2]) for i in range(0, len(moves), 2)]
+    >>> routine, functions = compress(tokens)
+    >>> movement_lines(routine, functions)
+    ['A,A,B,B,C,B,B,A,A,C', 'R,8', 'R,4', 'R,8,L,6,L,2', 'n']
+    >>> compress([f"R,{steps}" for steps in range(1, 17)]) is None
+    True
+    """
+    tokens = tuple(tokens)
+    max_calls = (MAX_ROUTINE_LENGTH + 1) // 2
+
+    @functools.lru_cache(maxsize=None)
+    def search(start, functions, num_calls):
+        if start == len(tokens):
+            return (), functions
+        if num_calls == max_calls:
+            return None
+
+        for index, function in enumerate(functions):
+            end = start + len(function)
+            if tokens[start:end] == function:
+                found = search(end, functions, num_calls + 1)
+                if found is not None:
+                    routine, all_functions = found
+                    return (index,) + routine, all_functions
+
+        if len(functions) == NUM_FUNCTIONS:
+            return None
+
+        length = -1
+        for end in range(start + 1, len(tokens) + 1):
+            length += len(tokens[end - 1]) + 1
+            if length > MAX_ROUTINE_LENGTH:
+                break
+            function = tokens[start:end]
+            found = search(end, functions + (function,), num_calls + 1)
+            if found is not None:
+                routine, all_functions = found
+                return (len(functions),) + routine, all_functions
+
+        return None
+
+    return search(0, (), 0)
+
+
+def movement_lines(routine, functions):
+    """Format the compressed path as input lines for the robot."""
+    lines = [",".join(FUNCTION_NAMES[index] for index in routine)]
+    for index in range(NUM_FUNCTIONS):
+        # NOTE: Every function has to be provided, even if unused.
+        function = functions[min(index, len(functions) - 1)]
+        lines.append(",".join(function))
+    lines.append("n")
+    return lines
 
 
 def main():
     filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
-        content = file_obj.read()
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
+
+    machine = Machine(copy.deepcopy(program))
+    camera = AsciiOutput()
+    halted = run_until_blocked(machine, AsciiInput(), camera)
+    assert halted
+    grid = to_grid(camera.lines)
+    rows, columns = find_intersections(grid)
+    print(int(np.sum(rows * columns)))
+
+    found = compress(trace_path(grid))
+    if found is None:
+        raise RuntimeError("Path can't be compressed")
+    routine, functions = found
 
-    print(len(content))
+    machine = Machine(copy.deepcopy(program))
+    machine.program[0] = 2
+    std_input = AsciiInput()
+    std_input.feed_lines(movement_lines(routine, functions))
+    std_output = AsciiOutput()
+    halted = run_until_blocked(machine, std_input, std_output)
+    assert halted
+    print(std_output.values[-1])
 
 
 if __name__ == "__main__":
+    doctest.testmod()
     main()
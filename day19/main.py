@@ -10,19 +10,470 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import doctest
+import operator
 import pathlib
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+EMPTY_ROW_SLOPE = 10
+SCAN_SIZE = 50
+SQUARE_SIZE = 100
+
+
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class CowMemory:
+    """Copy-on-write Intcode memory.
+
+    Reads fall through the cells written by this machine to a shared,
+    read-only ``base`` image of the program, so a fork only copies the
+    (typically few) cells that have been written.
+    """
+
+    __slots__ = ("base", "written")
+
+    def __init__(self, base, written=None):
+        self.base = base
+        self.written = {} if written is None else written
+
+    def __getitem__(self, key):
+        written = self.written
+        if key in written:
+            return written[key]
+        return self.base.get(key, 0)
+
+    def __setitem__(self, key, value):
+        self.written[key] = value
+
+    def fork(self):
+        return CowMemory(self.base, self.written.copy())
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+    def fork(self):
+        return Machine(self.program.fork(), self.index, self.relative_base)
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+class Beam:
+    """Tractor beam queries, with a cache of the coordinates already seen.
+
+    Every query runs a fork of a single pristine copy-on-write image of the
+    program, so starting a VM doesn't copy the program.
+    """
+
+    def __init__(self, program):
+        self.machine = Machine(CowMemory(program))
+        self.cache = {}
+        self.num_runs = 0
+
+    def query(self, x, y):
+        point = x, y
+        if point not in self.cache:
+            self.cache[point] = self._run(point)
+        return self.cache[point]
+
+    def query_many(self, points):
+        """Query a batch of coordinates; only uncached points run the VM."""
+        cache = self.cache
+        for point in points:
+            if point not in cache:
+                cache[point] = self._run(point)
+        return [cache[point] for point in points]
+
+    def _run(self, point):
+        self.num_runs += 1
+        std_output = []
+        run_machine(self.machine.fork(), iter(point), std_output)
+        pulled, = std_output
+        return pulled
+
+
+def beam_rows(beam):
+    """Yield the pulled span ``(start, end)`` of each row, or ``None``.
+
+    Neither edge of the beam moves left from one row to the next, so each
+    edge is followed from where it was in the previous row; this takes
+    O(1) (amortized) queries per row. Near the origin the beam may skip
+    rows entirely, so after an empty row the next one is probed as a
+    single batch over a window of ``EMPTY_ROW_SLOPE`` columns per row.
+
+    For example, with a beam that pulls ``(x, y)`` when
+    ``6 y <= 10 x <= 8 y``:
+
+    >>> program = [
+    ...     *(3, 100, 3, 101),  # Read x and y
+    ...     *(1002, 100, 10, 102, 1002, 101, 6, 103, 1002, 101, 8, 104),
+    ...     *(7, 102, 103, 105, 7, 104, 102, 106),  # 10 x < 6 y, 8 y < 10 x
+    ...     *(1, 105, 106, 107, 1008, 107, 0, 108, 4, 108, 99),
+    ... ]
+    >>> rows = beam_rows(Beam(dict(enumerate(program))))
+    >>> [next(rows) for _ in range(8)]
+    [(0, 0), None, None, (2, 2), (3, 3), (3, 4), (4, 4), (5, 5)]
+    """
+    start = end = 0
+    empty = True
+    y = 0
+    while True:
+        limit = max(end + 1, EMPTY_ROW_SLOPE * (y + 1))
+        if empty:
+            window = range(start, limit)
+            pulled = beam.query_many([(x, y) for x in window])
+            found = [x for x, value in zip(window, pulled) if value]
+            empty = not found
+            if not empty:
+                start = found[0]
+        else:
+            x = start
+            while x < limit and not beam.query(x, y):
+                x += 1
+            empty = x == limit
+            if not empty:
+                start = x
+
+        if empty:
+            yield None
+        else:
+            end = max(end, start)
+            while beam.query(end + 1, y):
+                end += 1
+            yield start, end
+
+        y += 1
+
+
+def count_pulled(beam, size):
+    """Count the points pulled in the ``size x size`` square at the origin."""
+    total = 0
+    for _, span in zip(range(size), beam_rows(beam)):
+        if span is None:
+            continue
+        start, end = span
+        if start < size:
+            total += min(end, size - 1) - start + 1
+
+    return total
+
+
+def find_square(beam, size):
+    """Find the closest ``size x size`` square that fits in the beam.
+
+    The bottom left corner of the square is at the start of a row ``y``, so
+    it fits if the row ``size - 1`` above reaches far enough to the right.
+
+    For example, with a beam that pulls ``(x, y)`` when
+    ``6 y <= 10 x <= 8 y``:
+
+    >>> program = [
+    ...     *(3, 100, 3, 101),  # Read x and y
+    ...     *(1002, 100, 10, 102, 1002, 101, 6, 103, 1002, 101, 8, 104),
+    ...     *(7, 102, 103, 105, 7, 104, 102, 106),  # 10 x < 6 y, 8 y < 10 x
+    ...     *(1, 105, 106, 107, 1008, 107, 0, 108, 4, 108, 99),
+    ... ]
+    >>> beam = Beam(dict(enumerate(program)))
+    >>> count_pulled(beam, 10)
+    11
+    >>> find_square(beam, 3)
+    (12, 18)
+    """
+    ends = {}
+    for y, span in enumerate(beam_rows(beam)):
+        if span is None:
+            continue
+        start, end = span
+        ends[y] = end
+        top = y - size + 1
+        if ends.get(top, -1) >= start + size - 1:
+            return start, top
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
+        content = file_obj.read()
+
+    return np.array(content.strip().split(b",")).astype(np.int64)
 
 
 def main():
     filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
-        content = file_obj.read()
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = dict(enumerate(load_program(filename).tolist()))
 
-    print(len(content))
+    beam = Beam(program)
+    print(count_pulled(beam, SCAN_SIZE))
+    x, y = find_square(beam, SQUARE_SIZE)
+    print(10000 * x + y)
+    print(f"VM runs: {beam.num_runs}")
 
 
 if __name__ == "__main__":
+    doctest.testmod()
     main()
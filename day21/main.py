@@ -10,19 +10,711 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import collections
+import copy
+import doctest
+import itertools
+import multiprocessing
+import operator
+import os
 import pathlib
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+ASCII_MAX = 127
+SENSORS = "ABCDEFGHI"
+SENSOR_RANGES = {"WALK": 4, "RUN": 9}
+JUMP_DISTANCE = 4
+HOLE = "."
+GROUND = "#"
+# Jump if there is a hole in any of the next three tiles and ground to land
+# on (i.e. four tiles away).
+WALK_SCRIPT = (
+    "NOT A J",
+    "NOT B T",
+    "OR T J",
+    "NOT C T",
+    "OR T J",
+    "AND D J",
+    "WALK",
+)
+# Same as ``WALK_SCRIPT``, but only if it is possible to keep going after
+# landing (i.e. step once or jump again right away).
+RUN_SCRIPT = (
+    "NOT A J",
+    "NOT B T",
+    "OR T J",
+    "NOT C T",
+    "OR T J",
+    "AND D J",
+    "NOT E T",
+    "NOT T T",
+    "OR H T",
+    "AND T J",
+    "RUN",
+)
+# Droid snapshot (waiting for instructions) shared with each pool worker.
+WORKER_SNAPSHOT = None
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+class AsciiInput:
+    """Input channel fed with whole strings (or bytes) at a time.
+
+    Text is queued in bulk as code points in a ``collections.deque``; the
+    channel raises ``StopIteration`` when it runs dry (i.e. the VM blocks).
+    """
+
+    def __init__(self, text=""):
+        self.pending = collections.deque()
+        self.feed(text)
+
+    def feed(self, text):
+        if isinstance(text, str):
+            text = text.encode("ascii")
+        self.pending.extend(text)
+
+    def feed_lines(self, lines):
+        self.feed("".join(f"{line}\n" for line in lines))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+
+        return self.pending.popleft()
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class AsciiOutput:
+    """Output sink that decodes ASCII output into lines.
+
+    The VM's output is buffered in a ``bytearray`` and only decoded (in
+    bulk) by :meth:`flush`, e.g. once the VM blocks on input or halts.
+    Values that aren't ASCII (e.g. a large puzzle answer) are kept, in
+    order, in ``values``.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.lines = []
+        self.values = []
+
+    def append(self, value):
+        if 0 <= value <= ASCII_MAX:
+            self.buffer.append(value)
+        else:
+            self.values.append(value)
+
+    def flush(self):
+        """Decode every complete line in the buffer; returns the new lines."""
+        end = self.buffer.rfind(b"\n")
+        if end == -1:
+            return []
+
+        new_lines = self.buffer[:end].decode("ascii").split("\n")
+        del self.buffer[: end + 1]
+        self.lines.extend(new_lines)
+        return new_lines
+
+
+def run_until_blocked(machine, std_input, std_output):
+    """Run a machine until it halts or blocks on input.
+
+    The (ASCII) output is flushed either way. Returns a flag indicating if
+    the machine halted.
+
+    For example, a program that echoes its input blocks once the input
+    runs dry, and resumes (i.e. re-executes the INPUT) when more is fed:
+
+    >>> echo = [3, 100, 4, 100, 1105, 1, 0]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(echo)))
+    >>> std_input = AsciiInput()
+    >>> std_input.feed_lines(["hello"])
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_input.feed_lines(["world"])
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_output.lines
+    ['hello', 'world']
+
+    Output that isn't ASCII is kept separately:
+
+    >>> answer = [104, 79, 104, 75, 104, 10, 104, 1234, 99]
+    >>> machine = Machine(collections.defaultdict(int, enumerate(answer)))
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, AsciiInput(), std_output)
+    True
+    >>> std_output.lines, std_output.values
+    (['OK'], [1234])
+    """
+    try:
+        run_machine(machine, std_input, std_output)
+    except StopIteration:
+        halted = False
+    else:
+        halted = True
+
+    std_output.flush()
+    return halted
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    print(len(content))
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def prompt_snapshot(program):
+    """Run the program until the droid prompts for instructions."""
+    machine = Machine(copy.deepcopy(program))
+    halted = run_until_blocked(machine, AsciiInput(), AsciiOutput())
+    assert not halted
+    return machine
+
+
+def run_from_snapshot(snapshot, script):
+    machine = copy.deepcopy(snapshot)
+    std_input = AsciiInput()
+    std_input.feed_lines(script)
+    std_output = AsciiOutput()
+    halted = run_until_blocked(machine, std_input, std_output)
+    assert halted
+    return std_output
+
+
+def run_springscript(program, script):
+    return run_from_snapshot(prompt_snapshot(program), script)
+
+
+def _any_hole(sensors):
+    """Set ``J`` if any of ``sensors`` sees a hole."""
+    script = [f"NOT {sensors[0]} J"]
+    for sensor in sensors[1:]:
+        script.extend([f"NOT {sensor} T", "OR T J"])
+    return script
+
+
+def _any_ground(sensors):
+    """Set ``T`` if any of ``sensors`` sees ground."""
+    script = [f"NOT {sensors[0]} T", "NOT T T"]
+    script.extend(f"OR {sensor} T" for sensor in sensors[1:])
+    return script
+
+
+def candidate_scripts(mode):
+    """Candidate scripts, shortest first.
+
+    Each candidate jumps if any of a subset of the near sensors (``A-C``)
+    sees a hole and ``D`` (the landing spot) is ground. When running, the
+    droid also requires one of a subset of the far sensors (``E`` and on)
+    to be ground, so it isn't stuck after landing.
+    """
+    near = SENSORS[:3]
+    far = SENSORS[JUMP_DISTANCE : SENSOR_RANGES[mode]]
+    jumps = [
+        _any_hole(holes) + ["AND D J"]
+        for num_holes in range(1, len(near) + 1)
+        for holes in itertools.combinations(near, num_holes)
+    ]
+    landings = [[]] + [
+        _any_ground(grounds) + ["AND T J"]
+        for num_grounds in range(1, len(far) + 1)
+        for grounds in itertools.combinations(far, num_grounds)
+    ]
+    candidates = [
+        tuple(jump + landing + [mode])
+        for jump in jumps
+        for landing in landings
+    ]
+    candidates.sort(key=len)
+    return candidates
+
+
+def evaluate(instructions, sensors):
+    """Evaluate springscript ``instructions``; returns the ``J`` register.
+
+    >>> walk = [line.split() for line in WALK_SCRIPT[:-1]]
+    >>> evaluate(walk, {"A": True, "B": False, "C": True, "D": True})
+    True
+    >>> evaluate(walk, {"A": True, "B": False, "C": True, "D": False})
+    False
+    """
+    registers = {"T": False, "J": False}
+    registers.update(sensors)
+    for operation, source, target in instructions:
+        if operation == "AND":
+            registers[target] = registers[source] and registers[target]
+        elif operation == "OR":
+            registers[target] = registers[source] or registers[target]
+        elif operation == "NOT":
+            registers[target] = not registers[source]
+        else:
+            raise ValueError("Invalid instruction", operation)
+
+    return registers["J"]
+
+
+def survives(script, hull, start):
+    """Check if ``script`` may get the droid across ``hull`` (locally).
+
+    The cells past the end of ``hull`` are unknown, so wherever the script
+    reads one of them, the droid tries both jumping and stepping if either
+    is possible. Hence a script is only ruled out if it can't get across
+    ``hull``, whatever lies past the end.
+
+    >>> hull = "#####.##.########"
+    >>> survives(WALK_SCRIPT, hull, 0)
+    True
+    >>> survives(("NOT A J", "WALK"), hull, 0)
+    False
+
+    Jumping only when ``D`` sees a hole fails on ``"###.####"``, but
+    might not if the hull ended after the hole:
+
+    >>> survives(("NOT D J", "WALK"), "###.####", 0)
+    False
+    >>> survives(("NOT D J", "WALK"), "###.", 0)
+    True
+    """
+    instructions = [line.split() for line in script[:-1]]
+    sensors = SENSORS[: SENSOR_RANGES[script[-1]]]
+
+    def jumps(position):
+        """The values ``J`` may take at ``position``."""
+        known = {}
+        unknown = []
+        for offset, sensor in enumerate(sensors, start=1):
+            if position + offset < len(hull):
+                known[sensor] = hull[position + offset] != HOLE
+            else:
+                unknown.append(sensor)
+
+        values = set()
+        for guess in itertools.product((False, True), repeat=len(unknown)):
+            known.update(zip(unknown, guess))
+            values.add(evaluate(instructions, known))
+            if len(values) == 2:
+                break
+        return values
+
+    pending = [start]
+    visited = set()
+    while pending:
+        position = pending.pop()
+        if position >= len(hull):
+            return True
+        if position in visited or hull[position] == HOLE:
+            continue
+
+        visited.add(position)
+        for jump in jumps(position):
+            pending.append(position + (JUMP_DISTANCE if jump else 1))
+
+    return False
+
+
+def failing_hull(lines):
+    """Find the hull (and starting point) the droid fell on.
+
+    The first frame of the droid's last moments has the droid (``@``) on
+    the row directly above the hull.
+    """
+    for index, line in enumerate(lines):
+        if "@" in line:
+            hull = lines[index + 1]
+            if set(hull) <= {GROUND, HOLE}:
+                return hull, line.index("@")
+
+    raise ValueError("No failing hull in output", lines)
+
+
+def attach_worker_snapshot(snapshot):
+    global WORKER_SNAPSHOT
+
+    WORKER_SNAPSHOT = snapshot
+
+
+def run_candidate(script):
+    return run_from_snapshot(WORKER_SNAPSHOT, script)
+
+
+def search_springscript(snapshot, mode, pool=None, batch_size=1):
+    """Search the candidate scripts for one that gets the droid across.
+
+    Every candidate restores ``snapshot`` (i.e. the droid waiting for
+    instructions) rather than running the program from the start. After
+    each batch, candidates that would fail on a hull the droid has already
+    fallen on are discarded without running them.
+
+    The result is the first candidate (in order) that gets across, whether
+    or not a ``pool`` is used. Returns that script, the hull damage and
+    the number of candidates that were run.
+    """
+    failures = []
+    pending = candidate_scripts(mode)
+    num_runs = 0
+    while pending:
+        batch = pending[:batch_size]
+        pending = pending[batch_size:]
+        if pool is None:
+            results = [run_from_snapshot(snapshot, script) for script in batch]
+        else:
+            results = pool.map(run_candidate, batch)
+        num_runs += len(batch)
+
+        for script, std_output in zip(batch, results):
+            if std_output.values:
+                hull_damage, = std_output.values
+                return script, hull_damage, num_runs
+            failures.append(failing_hull(std_output.lines))
+
+        pending = [
+            script
+            for script in pending
+            if all(survives(script, hull, start) for hull, start in failures)
+        ]
+
+    raise RuntimeError("No candidate script gets across", mode)
+
+
+def search_springscript_parallel(snapshot, mode, processes=None):
+    """Parallel version of :func:`search_springscript`.
+
+    The snapshot is sent to each worker once, rather than being pickled and
+    sent along with every candidate.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    with multiprocessing.Pool(
+        processes=processes,
+        initializer=attach_worker_snapshot,
+        initargs=(snapshot,),
+    ) as pool:
+        return search_springscript(
+            snapshot, mode, pool=pool, batch_size=processes
+        )
+
+
+def main(search):
+    filename = HERE / "input.txt"
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
+
+    if search:
+        snapshot = prompt_snapshot(program)
+        for mode in SENSOR_RANGES:
+            if (os.cpu_count() or 1) > 1:
+                script, hull_damage, num_runs = search_springscript_parallel(
+                    snapshot, mode
+                )
+            else:
+                script, hull_damage, num_runs = search_springscript(
+                    snapshot, mode
+                )
+            print(hull_damage)
+            print(f"{len(script) - 1} instructions, {num_runs} runs")
+            print("\n".join(script))
+        return
+
+    for script in (WALK_SCRIPT, RUN_SCRIPT):
+        std_output = run_springscript(program, script)
+        if std_output.values:
+            hull_damage, = std_output.values
+            print(hull_damage)
+        else:
+            # The droid fell into space, show the last moments.
+            print("\n".join(std_output.lines))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="Search for scripts rather than using the known ones",
+    )
+    args = parser.parse_args()
+    doctest.testmod()
+    main(args.search)
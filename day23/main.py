@@ -10,19 +10,441 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import copy
+import doctest
+import operator
 import pathlib
+import time
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+NUM_NODES = 50
+NAT_ADDRESS = 255
+NO_PACKET = -1
+
+
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+class NetworkInput:
+    """Input queue of a node, i.e. packets (as ``x``, ``y`` pairs) to read.
+
+    When the queue is empty the node reads ``-1`` (no packet), but only
+    once per turn: the next read raises ``StopIteration``, i.e. the node
+    blocks and the scheduler moves on to the next node.
+    """
+
+    def __init__(self, address):
+        self.pending = collections.deque([address])
+        self.polled = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pending:
+            return self.pending.popleft()
+        if self.polled:
+            raise StopIteration
+
+        self.polled = True
+        return NO_PACKET
+
+
+class NetworkOutput:
+    """Output sink of a node; sends a packet once all three values are out."""
+
+    def __init__(self, network):
+        self.network = network
+        self.values = []
+
+    def append(self, value):
+        self.values.append(value)
+        if len(self.values) == 3:
+            self.network.send(*self.values)
+            self.values = []
+
+
+class Network:
+    """Network of Intcode computers, with a NAT.
+
+    Every node is run (in address order) until it blocks on input, which
+    makes up a round. The network is idle after a round where no packets
+    were sent and every queue is empty; the NAT then sends the last packet
+    it received to node 0.
+
+    For example, in a network where node 0 starts by sending ``(3, 4)`` to
+    the NAT and every node forwards the packets it gets to the NAT:
+
+    >>> node = [
+    ...     *(3, 50, 1005, 50, 11),  # Read the address, skip unless 0
+    ...     *(104, 255, 104, 3, 104, 4),  # Send (3, 4) to the NAT
+    ...     *(3, 51, 1008, 51, -1, 52, 1005, 52, 11),  # Wait for a packet
+    ...     *(3, 53, 104, 255, 4, 51, 4, 53),  # Forward it to the NAT
+    ...     *(1105, 1, 11),
+    ... ]
+    >>> network = Network(collections.defaultdict(int, enumerate(node)), 2)
+    >>> network.run()
+    4
+    >>> network.first_nat_packet, network.nat_sent, network.num_packets
+    ((3, 4), [4], 3)
+    """
+
+    def __init__(self, program, num_nodes=NUM_NODES):
+        self.machines = [
+            Machine(copy.deepcopy(program)) for _ in range(num_nodes)
+        ]
+        self.inputs = [NetworkInput(address) for address in range(num_nodes)]
+        self.outputs = [NetworkOutput(self) for _ in range(num_nodes)]
+        self.num_packets = 0
+        self.nat_packet = None
+        self.first_nat_packet = None
+        self.nat_sent = []
+
+    def send(self, address, x, y):
+        self.num_packets += 1
+        if address == NAT_ADDRESS:
+            self.nat_packet = x, y
+            if self.first_nat_packet is None:
+                self.first_nat_packet = x, y
+        else:
+            self.inputs[address].pending.extend((x, y))
+
+    def run_round(self):
+        """Run every node until it blocks; returns the number of packets sent."""
+        num_packets = self.num_packets
+        for address, machine in enumerate(self.machines):
+            std_input = self.inputs[address]
+            std_input.polled = False
+            try:
+                run_machine(machine, std_input, self.outputs[address])
+            except StopIteration:
+                continue
+            raise RuntimeError("Node halted", address)
+
+        return self.num_packets - num_packets
+
+    def is_idle(self):
+        return all(not std_input.pending for std_input in self.inputs)
+
+    def run(self):
+        """Run until the NAT sends the same ``y`` value twice in a row.
+
+        Returns that ``y`` value.
+        """
+        while True:
+            num_sent = self.run_round()
+            if num_sent > 0 or not self.is_idle():
+                continue
+
+            if self.nat_packet is None:
+                raise RuntimeError("Network is idle and the NAT is empty")
+            x, y = self.nat_packet
+            if self.nat_sent and self.nat_sent[-1] == y:
+                return y
+            self.nat_sent.append(y)
+            self.send(0, x, y)
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
+        content = file_obj.read()
+
+    return np.array(content.strip().split(b",")).astype(np.int64)
 
 
 def main():
     filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
-        content = file_obj.read()
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = collections.defaultdict(
+        int, enumerate(load_program(filename).tolist())
+    )
+
+    network = Network(program)
+    start = time.perf_counter()
+    repeated_y = network.run()
+    duration = time.perf_counter() - start
 
-    print(len(content))
+    _, first_y = network.first_nat_packet
+    print(first_y)
+    print(repeated_y)
+    packets_per_second = network.num_packets / duration
+    print(
+        f"{network.num_packets} packets in {duration:.3f}s "
+        f"({packets_per_second:.0f} packets/s)"
+    )
 
 
 if __name__ == "__main__":
+    doctest.testmod()
     main()
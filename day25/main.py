@@ -10,19 +10,771 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import collections
+import doctest
+import operator
 import pathlib
+import re
+import uuid
+
+import numpy as np
 
 
 HERE = pathlib.Path(__file__).resolve().parent
+OPCODES = {
+    1: ("ADD", 3),
+    2: ("MULTIPLY", 3),
+    3: ("INPUT", 1),
+    4: ("OUTPUT", 1),
+    5: ("JUMP-IF-TRUE", 2),
+    6: ("JUMP-IF-FALSE", 2),
+    7: ("LESS-THAN", 3),
+    8: ("EQUALS", 3),
+    9: ("ADJUST_BASE", 1),
+    99: ("HALT", 0),
+}
+POSITION_MODE = "0"
+IMMEDIATE_MODE = "1"
+RELATIVE_MODE = "2"
+ALL_MODES = set("012")
+NO_JUMP_JUMP_INDEX = uuid.uuid4()
+TERMINAL_JUMP_INDEX = uuid.uuid4()
+ASCII_MAX = 127
+MAX_SNAPSHOTS = 16
+# NOTE: Taking the infinite loop never returns control, so it can't be
+#       tried out safely, even on a snapshot.
+UNSAFE_ITEMS = frozenset(["infinite loop"])
+PASSWORD_PATTERN = re.compile(r"typing (\d+) on the keypad")
 
 
-def main():
-    filename = HERE / "input.txt"
-    with open(filename, "r") as file_obj:
+class AdjustBase:
+    def __init__(self, value):
+        self.value = value
+
+
+def less_than_binary_op(value1, value2):
+    if value1 < value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def equal_binary_op(value1, value2):
+    if value1 == value2:
+        to_store = 1
+    else:
+        to_store = 0
+
+    return to_store
+
+
+def get_value(mode, param, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        return program[index]
+
+    if mode == IMMEDIATE_MODE:
+        return param
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        return program[index]
+
+    raise ValueError("Invalid mode", mode)
+
+
+def set_value(mode, param, to_store, relative_base, program):
+    if mode == POSITION_MODE:
+        index = param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    if mode == RELATIVE_MODE:
+        index = relative_base + param
+        assert 0 <= index
+        program[index] = to_store
+        return
+
+    raise ValueError("Invalid mode", mode)
+
+
+def _do_binary_op(modes, params, relative_base, program, fn):
+    mode1, mode2, mode3 = modes
+    param1, param2, param3 = params
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    to_store = fn(value1, value2)
+    set_value(mode3, param3, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_add(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.add)
+
+
+def do_multiply(modes, params, relative_base, program):
+    return _do_binary_op(modes, params, relative_base, program, operator.mul)
+
+
+def do_input(modes, params, relative_base, program, std_input):
+    mode, = modes
+    param, = params
+
+    to_store = next(std_input)
+    set_value(mode, param, to_store, relative_base, program)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_output(modes, params, relative_base, program, std_output):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    std_output.append(value)
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def _do_jump_unary_predicate(modes, params, relative_base, program, fn):
+    mode1, mode2 = modes
+    param1, param2 = params
+
+    value1 = get_value(mode1, param1, relative_base, program)
+    value2 = get_value(mode2, param2, relative_base, program)
+
+    if fn(value1):
+        return value2
+
+    return NO_JUMP_JUMP_INDEX
+
+
+def do_jump_if_true(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.truth
+    )
+
+
+def do_jump_if_false(modes, params, relative_base, program):
+    return _do_jump_unary_predicate(
+        modes, params, relative_base, program, operator.not_
+    )
+
+
+def do_less_than(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, less_than_binary_op
+    )
+
+
+def do_equal(modes, params, relative_base, program):
+    return _do_binary_op(
+        modes, params, relative_base, program, equal_binary_op
+    )
+
+
+def do_adjust_base(modes, params, relative_base, program):
+    mode, = modes
+    param, = params
+
+    value = get_value(mode, param, relative_base, program)
+    return AdjustBase(value)
+
+
+def do_halt():
+    return TERMINAL_JUMP_INDEX
+
+
+def next_instruction(index, program):
+    assert 0 <= index
+    op_code_with_extra = program[index]
+    assert op_code_with_extra >= 0
+
+    mode_as_int, op_code = divmod(op_code_with_extra, 100)
+    instruction, num_params = OPCODES[op_code]
+    next_index = index + 1 + num_params
+    if num_params == 0:
+        assert mode_as_int == 0
+        return instruction, (), (), next_index
+
+    mode_chars = str(mode_as_int).zfill(num_params)
+    assert len(mode_chars) == num_params, (mode_chars, num_params)
+    assert set(mode_chars) <= ALL_MODES
+    modes = tuple(reversed(mode_chars))
+
+    params = tuple(program[i] for i in range(index + 1, next_index))
+    assert len(params) == num_params  # No partial slice
+
+    return instruction, modes, params, next_index
+
+
+def execute_instruction(
+    instruction, modes, params, relative_base, program, std_input, std_output
+):
+    if instruction == "ADD":
+        return do_add(modes, params, relative_base, program)
+
+    if instruction == "MULTIPLY":
+        return do_multiply(modes, params, relative_base, program)
+
+    if instruction == "INPUT":
+        return do_input(modes, params, relative_base, program, std_input)
+
+    if instruction == "OUTPUT":
+        return do_output(modes, params, relative_base, program, std_output)
+
+    if instruction == "JUMP-IF-TRUE":
+        return do_jump_if_true(modes, params, relative_base, program)
+
+    if instruction == "JUMP-IF-FALSE":
+        return do_jump_if_false(modes, params, relative_base, program)
+
+    if instruction == "LESS-THAN":
+        return do_less_than(modes, params, relative_base, program)
+
+    if instruction == "EQUALS":
+        return do_equal(modes, params, relative_base, program)
+
+    if instruction == "ADJUST_BASE":
+        return do_adjust_base(modes, params, relative_base, program)
+
+    if instruction == "HALT":
+        return do_halt()
+
+    raise ValueError("Bad instruction", instruction, modes, params, program)
+
+
+class CowMemory:
+    """Copy-on-write Intcode memory.
+
+    Reads fall through the cells written by this machine to a shared,
+    read-only ``base`` image of the program, so a fork only copies the
+    (typically few) cells that have been written.
+    """
+
+    __slots__ = ("base", "written")
+
+    def __init__(self, base, written=None):
+        self.base = base
+        self.written = {} if written is None else written
+
+    def __getitem__(self, key):
+        written = self.written
+        if key in written:
+            return written[key]
+        return self.base.get(key, 0)
+
+    def __setitem__(self, key, value):
+        self.written[key] = value
+
+    def fork(self):
+        return CowMemory(self.base, self.written.copy())
+
+
+class Machine:
+    def __init__(self, program, index=0, relative_base=0):
+        self.program = program
+        self.index = index
+        self.relative_base = relative_base
+
+    def fork(self):
+        return Machine(self.program.fork(), self.index, self.relative_base)
+
+
+def run_machine(machine, std_input, std_output):
+    # NOTE: `machine.index` is only advanced **after** an instruction has
+    #       executed, so a machine that is blocked on `std_input` (i.e.
+    #       `next()` raised `StopIteration`) will re-execute that INPUT when
+    #       resumed.
+    program = machine.program
+    jump_index = NO_JUMP_JUMP_INDEX
+    while jump_index != TERMINAL_JUMP_INDEX:
+        instruction, modes, params, next_index = next_instruction(
+            machine.index, program
+        )
+        jump_index = execute_instruction(
+            instruction,
+            modes,
+            params,
+            machine.relative_base,
+            program,
+            std_input,
+            std_output,
+        )
+        if isinstance(jump_index, AdjustBase):
+            machine.relative_base += jump_index.value
+            machine.index = next_index
+        elif jump_index in (NO_JUMP_JUMP_INDEX, TERMINAL_JUMP_INDEX):
+            machine.index = next_index
+        elif jump_index >= 0:
+            machine.index = jump_index
+        else:
+            raise ValueError("Invalid jump index", jump_index)
+
+    return program
+
+
+class AsciiInput:
+    """Input channel fed with whole strings (or bytes) at a time.
+
+    Text is queued in bulk as code points in a ``collections.deque``; the
+    channel raises ``StopIteration`` when it runs dry (i.e. the VM blocks).
+    """
+
+    def __init__(self, text=""):
+        self.pending = collections.deque()
+        self.feed(text)
+
+    def feed(self, text):
+        if isinstance(text, str):
+            text = text.encode("ascii")
+        self.pending.extend(text)
+
+    def feed_lines(self, lines):
+        self.feed("".join(f"{line}\n" for line in lines))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.pending:
+            raise StopIteration
+
+        return self.pending.popleft()
+
+    def __len__(self):
+        return len(self.pending)
+
+
+class AsciiOutput:
+    """Output sink that decodes ASCII output into lines.
+
+    The VM's output is buffered in a ``bytearray`` and only decoded (in
+    bulk) by :meth:`flush`, e.g. once the VM blocks on input or halts.
+    Values that aren't ASCII (e.g. a large puzzle answer) are kept, in
+    order, in ``values``.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.lines = []
+        self.values = []
+
+    def append(self, value):
+        if 0 <= value <= ASCII_MAX:
+            self.buffer.append(value)
+        else:
+            self.values.append(value)
+
+    def flush(self):
+        """Decode every complete line in the buffer; returns the new lines."""
+        end = self.buffer.rfind(b"\n")
+        if end == -1:
+            return []
+
+        new_lines = self.buffer[:end].decode("ascii").split("\n")
+        del self.buffer[: end + 1]
+        self.lines.extend(new_lines)
+        return new_lines
+
+
+def run_until_blocked(machine, std_input, std_output):
+    """Run a machine until it halts or blocks on input.
+
+    The (ASCII) output is flushed either way. Returns a flag indicating if
+    the machine halted.
+
+    For example, a program that echoes its input blocks once the input
+    runs dry, and resumes (i.e. re-executes the INPUT) when more is fed:
+
+    >>> echo = [3, 100, 4, 100, 1105, 1, 0]
+    >>> machine = Machine(CowMemory(dict(enumerate(echo))))
+    >>> std_input = AsciiInput()
+    >>> std_input.feed_lines(["hello"])
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_input.feed_lines(["world"])
+    >>> run_until_blocked(machine, std_input, std_output)
+    False
+    >>> std_output.lines
+    ['hello', 'world']
+
+    Output that isn't ASCII is kept separately:
+
+    >>> answer = [104, 79, 104, 75, 104, 10, 104, 1234, 99]
+    >>> machine = Machine(CowMemory(dict(enumerate(answer))))
+    >>> std_output = AsciiOutput()
+    >>> run_until_blocked(machine, AsciiInput(), std_output)
+    True
+    >>> std_output.lines, std_output.values
+    (['OK'], [1234])
+    """
+    try:
+        run_machine(machine, std_input, std_output)
+    except StopIteration:
+        halted = False
+    else:
+        halted = True
+
+    std_output.flush()
+    return halted
+
+
+def load_program(filename):
+    """Parse a comma-separated Intcode program into an ``int64`` array.
+
+    The text is converted in a single NumPy call rather than value by value.
+    """
+    with open(filename, "rb") as file_obj:
         content = file_obj.read()
 
-    print(len(content))
+    return np.array(content.strip().split(b",")).astype(np.int64)
+
+
+def parse_room(lines):
+    """Parse the last room description in ``lines``.
+
+    Returns the name of the room, the doors leading out of it and the items
+    in it.
+
+    >>> lines = [
+    ...     "== Hull Breach ==",
+    ...     "You got in through a hole in the floor here.",
+    ...     "",
+    ...     "== Kitchen ==",
+    ...     "Everything's freeze-dried.",
+    ...     "",
+    ...     "Doors here lead:",
+    ...     "- north",
+    ...     "- west",
+    ...     "",
+    ...     "Items here:",
+    ...     "- mug",
+    ...     "",
+    ...     "Command?",
+    ... ]
+    >>> parse_room(lines)
+    ('Kitchen', ['north', 'west'], ['mug'])
+    """
+    headers = [i for i, line in enumerate(lines) if line.startswith("== ")]
+    if not headers:
+        raise ValueError("No room description", lines)
+
+    start = headers[-1]
+    name = lines[start][3:-3]
+    doors = []
+    items = []
+    section = None
+    for line in lines[start + 1 :]:
+        if line == "Doors here lead:":
+            section = doors
+        elif line == "Items here:":
+            section = items
+        elif line.startswith("- ") and section is not None:
+            section.append(line[2:])
+        else:
+            section = None
+
+    return name, doors, items
+
+
+def send(machine, commands):
+    """Run ``commands`` on a fork of ``machine``.
+
+    Returns the fork, the lines of output and a flag indicating if the
+    fork halted.
+    """
+    child = machine.fork()
+    std_input = AsciiInput()
+    std_input.feed_lines(commands)
+    std_output = AsciiOutput()
+    halted = run_until_blocked(child, std_input, std_output)
+    return child, std_output.lines, halted
+
+
+class Explorer:
+    """Explore the ship by restoring a snapshot of the droid in each room.
+
+    Snapshots are kept in an LRU of at most ``max_snapshots`` rooms (the
+    start room is pinned); a room that has been evicted is restored by
+    replaying the path to it from the start.
+
+    For example, with a droid that describes the same room forever:
+
+    >>> text = b"== Hall ==\\nDoors here lead:\\n- north\\n"
+    >>> program = [value for char in text for value in (104, char)]
+    >>> program.extend([3, 1000, 1105, 1, 0])
+    >>> explorer = Explorer(dict(enumerate(program)), max_snapshots=2)
+    >>> for name in ("A", "B", "C"):
+    ...     explorer.paths[name] = ["north"]
+    ...     explorer.store(name, explorer.start_machine.fork())
+    >>> list(explorer.snapshots)
+    ['B', 'C']
+    >>> _ = explorer.snapshot("B")
+    >>> list(explorer.snapshots), explorer.num_replays
+    (['C', 'B'], 0)
+    >>> _ = explorer.snapshot("A")
+    >>> list(explorer.snapshots), explorer.num_replays
+    (['B', 'A'], 1)
+    >>> explorer.snapshot("Hall") is explorer.start_machine
+    True
+    >>> list(explorer.snapshots)
+    ['B', 'A']
+    """
+
+    def __init__(self, program, max_snapshots=MAX_SNAPSHOTS):
+        self.start_machine, lines, _ = send(Machine(CowMemory(program)), [])
+        self.start, doors, items = parse_room(lines)
+        self.doors = {self.start: dict.fromkeys(doors)}
+        self.items = {self.start: items}
+        self.paths = {self.start: []}
+        self.snapshots = collections.OrderedDict()
+        self.max_snapshots = max_snapshots
+        self.num_replays = 0
+        self.checkpoint = None
+        self.floor_door = None
+
+    def store(self, name, machine):
+        self.snapshots[name] = machine
+        self.snapshots.move_to_end(name)
+        while len(self.snapshots) > self.max_snapshots:
+            self.snapshots.popitem(last=False)
+
+    def snapshot(self, name):
+        if name == self.start:
+            return self.start_machine
+
+        machine = self.snapshots.get(name)
+        if machine is None:
+            self.num_replays += 1
+            machine, _, _ = send(self.start_machine, self.paths[name])
+        self.store(name, machine)
+        return machine
+
+    def explore(self):
+        """Map every room (and door) with a breadth-first search."""
+        queue = collections.deque([self.start])
+        while queue:
+            name = queue.popleft()
+            machine = self.snapshot(name)
+            for direction in self.doors[name]:
+                child, lines, halted = send(machine, [direction])
+                if halted:
+                    raise RuntimeError("Droid halted", name, direction)
+
+                neighbor, doors, items = parse_room(lines)
+                if neighbor == name:
+                    # NOTE: The pressure-sensitive floor ejects the droid
+                    #       back to the checkpoint.
+                    self.checkpoint = name
+                    self.floor_door = direction
+                    continue
+
+                self.doors[name][direction] = neighbor
+                if neighbor not in self.doors:
+                    self.doors[neighbor] = dict.fromkeys(doors)
+                    self.items[neighbor] = items
+                    self.paths[neighbor] = self.paths[name] + [direction]
+                    self.store(neighbor, child)
+                    queue.append(neighbor)
+
+        if self.checkpoint is None:
+            raise RuntimeError("No pressure-sensitive floor found")
+
+    def is_safe(self, name, item):
+        """Check if ``item`` can be taken (and carried out of the room).
+
+        For example, with a droid that describes the same room forever,
+        only the known-unsafe items are rejected:
+
+        >>> text = b"== Hall ==\\nDoors here lead:\\n- north\\n"
+        >>> room = [value for char in text for value in (104, char)]
+        >>> explorer = Explorer(dict(enumerate(room + [3, 1000, 1105, 1, 0])))
+        >>> explorer.is_safe("Hall", "mug"), explorer.is_safe("Hall", "infinite loop")
+        (True, False)
+
+        whereas with a droid that halts on any command, nothing is safe:
+
+        >>> explorer = Explorer(dict(enumerate(room + [3, 1000, 99])))
+        >>> explorer.is_safe("Hall", "mug")
+        False
+        """
+        if item in UNSAFE_ITEMS:
+            return False
+
+        child, _, halted = send(self.snapshot(name), [f"take {item}"])
+        if halted:
+            return False
+
+        direction = next(iter(self.doors[name]))
+        _, lines, halted = send(child, [direction])
+        return not halted and any(line.startswith("== ") for line in lines)
+
+    def route(self, source, target):
+        """Shortest list of moves from ``source`` to ``target``."""
+        paths = {source: []}
+        queue = collections.deque([source])
+        while queue:
+            name = queue.popleft()
+            if name == target:
+                return paths[name]
+            for direction, neighbor in self.doors[name].items():
+                if neighbor is None or neighbor in paths:
+                    continue
+                paths[neighbor] = paths[name] + [direction]
+                queue.append(neighbor)
+
+        raise ValueError("No route", source, target)
+
+    def collect(self, items):
+        """Take every item in ``items`` and walk to the checkpoint.
+
+        ``items`` maps each item to the room it is in. Returns the machine,
+        blocked at the checkpoint.
+        """
+        commands = []
+        current = self.start
+        for item, name in items.items():
+            commands.extend(self.route(current, name))
+            commands.append(f"take {item}")
+            current = name
+        commands.extend(self.route(current, self.checkpoint))
+
+        machine, _, halted = send(self.start_machine, commands)
+        if halted:
+            raise RuntimeError("Droid halted while collecting items")
+        return machine
+
+
+def find_password(machine, items, floor_door, send=send):
+    """Try subsets of ``items`` on the pressure-sensitive floor.
+
+    The droid starts out holding every item and subsets are visited in Gray
+    code order, so each attempt only takes or drops a single item.
+
+    Returns the password and the items held when the floor let the droid
+    through.
+
+    For example, with a stub in place of :func:`send` where the "machine"
+    is just the set of items held and the floor only accepts ``b``:
+
+    >>> attempts = []
+    >>> def stub_send(held, commands):
+    ...     attempts.append(commands)
+    ...     held = set(held)
+    ...     for command in commands[:-1]:
+    ...         action, item = command.split()
+    ...         if action == "take":
+    ...             held.add(item)
+    ...         else:
+    ...             held.remove(item)
+    ...     if held == {"b"}:
+    ...         return held, ["Oh, hello! ... typing 42 on the keypad"], True
+    ...     return held, ["== Security Checkpoint =="], False
+    >>> items = ["a", "b", "c"]
+    >>> find_password(set(items), items, "north", send=stub_send)
+    ('42', ['b'])
+    >>> for commands in attempts:
+    ...     print(commands)
+    ['north']
+    ['drop a', 'north']
+    ['drop b', 'north']
+    ['take a', 'north']
+    ['drop c', 'north']
+    ['drop a', 'north']
+    ['take b', 'north']
+    """
+    held = set(items)
+    for step in range(2 ** len(items)):
+        commands = [floor_door]
+        if step:
+            # NOTE: The bit that flips between consecutive Gray codes is
+            #       the lowest set bit of ``step``.
+            item = items[(step & -step).bit_length() - 1]
+            if item in held:
+                held.remove(item)
+                commands.insert(0, f"drop {item}")
+            else:
+                held.add(item)
+                commands.insert(0, f"take {item}")
+
+        machine, lines, halted = send(machine, commands)
+        if halted:
+            match = PASSWORD_PATTERN.search("\n".join(lines))
+            if match is None:
+                raise RuntimeError("Droid halted without a password", lines)
+            return match.group(1), sorted(held)
+
+    raise RuntimeError("No subset of items is accepted", items)
+
+
+def play(program):
+    machine = Machine(CowMemory(program))
+    std_input = AsciiInput()
+    std_output = AsciiOutput()
+    num_printed = 0
+    while True:
+        halted = run_until_blocked(machine, std_input, std_output)
+        for line in std_output.lines[num_printed:]:
+            print(line)
+        num_printed = len(std_output.lines)
+        if halted:
+            break
+
+        try:
+            command = input()
+        except EOFError:
+            break
+        std_input.feed_lines([command])
+
+
+def main(interactive):
+    filename = HERE / "input.txt"
+    if not filename.read_text().strip():
+        print(f"{filename.name} is empty, there is no program to run")
+        return
+
+    program = dict(enumerate(load_program(filename).tolist()))
+    if interactive:
+        play(program)
+        return
+
+    explorer = Explorer(program)
+    explorer.explore()
+    safe_items = {
+        item: name
+        for name, items in explorer.items.items()
+        for item in items
+        if explorer.is_safe(name, item)
+    }
+    machine = explorer.collect(safe_items)
+    password, held = find_password(
+        machine, list(safe_items), explorer.floor_door
+    )
+    print(password)
+    print(", ".join(held))
+    print(
+        f"{len(explorer.doors)} rooms, "
+        f"{explorer.num_replays} snapshot replays"
+    )
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--interactive",
+        action="store_true",
+        help="Play the game from standard input",
+    )
+    args = parser.parse_args()
+    doctest.testmod()
+    main(args.interactive)